@@ -1,6 +1,6 @@
 import os
-from flask import Flask, render_template, request, session, redirect, url_for, jsonify, flash
-from flask_login import login_required, current_user, logout_user
+from flask import Flask, render_template, request, session, jsonify
+from flask_login import login_required, current_user
 from config import Config
 from extensions import db, login_manager, csrf
 from datetime import datetime
@@ -11,7 +11,12 @@ try:
 except ImportError:
     pass
 
-def create_app(config_class=Config):
+def create_app(config_class=Config, background_jobs=True):
+    """
+    `background_jobs` : False pour les processus auxiliaires (workers de rendu
+    PDF, benchmarks), qui ne doivent ni démarrer le planificateur ni
+    programmer les sauvegardes.
+    """
     app = Flask(__name__)
     app.config.from_object(config_class)
 
@@ -19,19 +24,44 @@ def create_app(config_class=Config):
     db.init_app(app)
     login_manager.init_app(app)
     csrf.init_app(app)
+
+    # Maintenance incrémentale du rollup mensuel (dashboard / rapports)
+    from services.rollup_service import register_rollup_listeners
+    register_rollup_listeners()
+
+    # Invalidation du cache des statistiques (compteur de version partagé)
+    from services.stats_cache import register_stats_cache_listeners
+    register_stats_cache_listeners()
+
+    # Index plein texte (FTS5) des documents et clients
+    from services.search_index import register_search_listeners
+    register_search_listeners()
+
+    # Suppression des PDF en cache des documents supprimés
+    from services.pdf_cache import register_pdf_cache_listeners
+    register_pdf_cache_listeners()
+
+    # Pré-rendu des PDF en arrière-plan (pool de processus, PDF_PRERENDER_WORKERS)
+    from services.pdf_prerender import init_pdf_prerender
+    init_pdf_prerender(app, config_class)
+
+    # Instrumentation SQL par requête (opt-in, SQL_INSTRUMENTATION)
+    from services.sql_profiler import init_sql_instrumentation
+    init_sql_instrumentation(app)
     
-    from extensions import scheduler
-    scheduler.init_app(app)
-    scheduler.start()
+    if background_jobs:
+        from extensions import scheduler
+        scheduler.init_app(app)
+        scheduler.start()
 
-    # Load and apply backup schedule
-    with app.app_context():
-        try:
-            from services.backup_service import BackupService
-            service = BackupService(app)
-            service.apply_schedule()
-        except Exception as e:
-            app.logger.error(f"Startup Schedule Error: {e}")
+        # Load and apply backup schedule
+        with app.app_context():
+            try:
+                from services.backup_service import BackupService
+                service = BackupService(app)
+                service.apply_schedule()
+            except Exception as e:
+                app.logger.error(f"Startup Schedule Error: {e}")
 
 
     login_manager.login_view = 'auth.login'
@@ -140,99 +170,26 @@ def create_app(config_class=Config):
         if current_user.is_authenticated:
             # Make session permanent to respect PERMANENT_SESSION_LIFETIME
             session.permanent = True
-            
-            # 1. Check for unique session enforcement
-            if 'sid' in session and current_user.current_session_id:
-                if session['sid'] != current_user.current_session_id:
-                    logout_user()
-                    from flask import flash
-                    flash("Votre session a été fermée car vous vous êtes connecté sur un autre appareil.", "warning")
-                    return redirect(url_for('auth.login'))
-
-            # 2. Check for Forced Ejection (Targeted)
+
+            # 1. Session validity (other device login, forced ejection):
+            # a single session-epoch comparison, see services/session_guard
             # Must happen BEFORE updating last_active to prevent "zombie" active status
-            if current_user.force_logout_at:
-                login_at = session.get('login_at')
-                # If login time is unknown OR login happened BEFORE the force logout
-                should_logout = False
-                
-                if not login_at:
-                    should_logout = True
-                else:
-                     # Handle string (serialized) vs datetime
-                    if isinstance(login_at, str):
-                        try:
-                            login_at = datetime.strptime(login_at, '%a, %d %b %Y %H:%M:%S %Z')
-                        except:
-                            pass
-                            
-                    if isinstance(login_at, datetime):
-                        # Ensure we compare apples to apples (remove timezone if any)
-                        login_at_naive = login_at.replace(tzinfo=None)
-                        force_logout_naive = current_user.force_logout_at.replace(tzinfo=None)
-                        
-                        if login_at_naive < force_logout_naive:
-                            should_logout = True
-                            
-                if should_logout:
-                     logout_user()
-                     session.clear()
-                     
-                     # Handle API requests with JSON 401
-                     if request.path.startswith('/api/') or request.is_json:
-                         return jsonify({'error': 'ejected', 'message': 'Session terminated'}), 401
-                         
-                     from flask import flash
-                     flash("Votre session a été terminée par un administrateur.", "danger")
-                     return redirect(url_for('auth.login'))
-
-            # 3. Update last active timestamp (Only if NOT ejected)
-            current_user.last_active = datetime.utcnow()
-            db.session.commit()
+            from services.session_guard import validate_session
+            rejected = validate_session()
+            if rejected is not None:
+                return rejected
+
+            # 2. Update last active timestamp (Only if NOT ejected)
+            # Buffered: written at most every ACTIVITY_FLUSH_INTERVAL seconds per user
+            from services.activity_tracker import touch
+            touch(current_user.id)
 
     # Inject CompanyInfo globally for templates (Theme, Logo, etc.)
-    @app.before_request
-    def check_ejection():
-        if current_user.is_authenticated and current_user.force_logout_at:
-            login_at = session.get('login_at')
-            # If login time is unknown OR login happened BEFORE the force logout
-            if not login_at:
-                 from flask_login import logout_user
-                 logout_user()
-                 session.clear()
-                 flash("Votre session a été terminée par un administrateur.", "danger")
-                 return redirect(url_for('auth.login'))
-                 
-            # Handle string (serialized) vs datetime
-            if isinstance(login_at, str):
-                try:
-                    # Attempt parse if it became a string in session
-                    login_at = datetime.strptime(login_at, '%a, %d %b %Y %H:%M:%S %Z')
-                except:
-                    pass
-
-            if isinstance(login_at, datetime):
-                # Ensure we compare apples to apples (remove timezone if any)
-                login_at_naive = login_at.replace(tzinfo=None)
-                force_logout_naive = current_user.force_logout_at.replace(tzinfo=None)
-                
-                if login_at_naive < force_logout_naive:
-                     from flask_login import logout_user
-                     logout_user()
-                     session.clear()
-                     
-                     # Handle API requests with JSON 401
-                     if request.path.startswith('/api/') or request.is_json:
-                         return jsonify({'error': 'ejected', 'message': 'Session terminated'}), 401
-                         
-                     flash("Votre session a été terminée par un administrateur.", "danger")
-                     return redirect(url_for('auth.login'))
-                 
     @app.context_processor
     def inject_global_data():
-        from models import CompanyInfo, AISettings
-        info = CompanyInfo.query.first()
-        ai_settings = AISettings.get_settings()
+        from services.settings_registry import get_company_info, get_ai_settings
+        info = get_company_info()
+        ai_settings = get_ai_settings()
         return dict(company_info=info, ai_settings=ai_settings)
     
     @app.after_request
@@ -247,6 +204,8 @@ def create_app(config_class=Config):
     def active_users_api():
         from models import User
         from datetime import datetime, timedelta
+        from services.activity_tracker import flush_activity
+        flush_activity()
         # Consider users active if they were seen in the last 5 minutes
         five_mins_ago = datetime.utcnow() - timedelta(minutes=5)
         active_users = User.query.filter(User.last_active >= five_mins_ago).all()
@@ -260,267 +219,69 @@ def create_app(config_class=Config):
             } for u in active_users]
         })
 
-    def get_stats():
-        from models import Document, Expense
-        from sqlalchemy import func, extract
-        from datetime import datetime, timedelta
-        
-        # 1. Filtres
+    def get_stats_filters():
+        # Filtres
         year_filter = request.args.get('year', type=int)
         date_start_str = request.args.get('start_date')
         date_end_str = request.args.get('end_date')
-        
-        # Déterminer la période de filtrage
-        if date_start_str and date_end_str:
-            start_date = datetime.strptime(date_start_str, '%Y-%m-%d')
-            end_date = datetime.strptime(date_end_str, '%Y-%m-%d') + timedelta(days=1)
-            filter_label = f"du {date_start_str} au {date_end_str}"
-            chart_mode = 'daily'
-        elif year_filter:
-            start_date = datetime(year_filter, 1, 1)
-            end_date = datetime(year_filter + 1, 1, 1)
-            filter_label = f"Année {year_filter}"
-            chart_mode = 'monthly'
-        else:
-            # Par défaut : Année en cours
-            now = datetime.now()
-            year_filter = now.year
-            start_date = datetime(year_filter, 1, 1)
-            end_date = datetime(year_filter + 1, 1, 1)
-            filter_label = f"Année {year_filter} (en cours)"
-            chart_mode = 'monthly'
-
-        # 2. Obtenir toutes les factures qui n'ont PAS d'avoir associé
-        avoir_sources = db.session.query(Document.source_document_id).filter(
-            Document.type == 'avoir', 
-            Document.source_document_id.isnot(None)
-        )
-        
-        base_query = Document.query.filter(
-            Document.type == 'facture',
-            Document.date >= start_date,
-            Document.date < end_date,
-            ~Document.id.in_(avoir_sources)
-        )
-        
-        # 3. Calculs des totaux
-        total_ht = db.session.query(func.sum(Document.montant_ht)).filter(
-            Document.type == 'facture',
-            Document.date >= start_date,
-            Document.date < end_date,
-            ~Document.id.in_(avoir_sources)
-        ).scalar() or 0.0
-        
-        total_ttc = db.session.query(func.sum(Document.montant_ttc)).filter(
-            Document.type == 'facture',
-            Document.date >= start_date,
-            Document.date < end_date,
-            ~Document.id.in_(avoir_sources)
-        ).scalar() or 0.0
-        
-        total_tva = db.session.query(func.sum(Document.tva)).filter(
-            Document.type == 'facture',
-            Document.date >= start_date,
-            Document.date < end_date,
-            ~Document.id.in_(avoir_sources)
-        ).scalar() or 0.0
-
-        total_autoliq = db.session.query(func.sum(Document.montant_ht)).filter(
-            Document.type == 'facture',
-            Document.autoliquidation == True,
-            Document.date >= start_date,
-            Document.date < end_date,
-            ~Document.id.in_(avoir_sources)
-        ).scalar() or 0.0
-        
-        total_regle = db.session.query(func.sum(Document.montant_ttc)).filter(
-            Document.type == 'facture',
-            Document.paid == True,
-            Document.date >= start_date,
-            Document.date < end_date,
-            ~Document.id.in_(avoir_sources)
-        ).scalar() or 0.0
-        
-        total_impaye = total_ttc - total_regle
-
-        # 3b. Calcul des dépenses (Bons de commande fournisseurs + Notes de Frais)
-        total_depenses_commandes = db.session.query(func.sum(Document.montant_ht)).filter(
-            Document.type == 'bon_de_commande',
-            Document.date >= start_date,
-            Document.date < end_date
-        ).scalar() or 0.0
-
-        total_depenses_expenses = db.session.query(func.sum(Expense.amount_ht)).filter(
-            Expense.date >= start_date,
-            Expense.date < end_date
-        ).scalar() or 0.0
-        
-        total_depenses = total_depenses_commandes + total_depenses_expenses
+        return year_filter, date_start_str, date_end_str
 
-        # 3c. Calcul TVA Déductible (Commandes + Notes de Frais)
-        tva_commandes = db.session.query(func.sum(Document.tva)).filter(
-            Document.type == 'bon_de_commande',
-            Document.date >= start_date,
-            Document.date < end_date
-        ).scalar() or 0.0
-
-        tva_expenses = db.session.query(func.sum(Expense.tva)).filter(
-            Expense.date >= start_date,
-            Expense.date < end_date
-        ).scalar() or 0.0
+    def get_stats():
+        from services.stats_cache import get_cached_stats
+        return get_cached_stats(*get_stats_filters())
 
-        total_tva_deductible = tva_commandes + tva_expenses
-        
-        benefice_net = total_ht - total_depenses
-        tva_nette = total_tva - total_tva_deductible
-        
-        # 4. Données pour le graphique
-        monthly_data = []
-        monthly_expense_data = []
-        labels = []
-        
-        if chart_mode == 'monthly':
-            for month in range(1, 13):
-                m_start = datetime(start_date.year, month, 1)
-                m_end = datetime(start_date.year + 1, 1, 1) if month == 12 else datetime(start_date.year, month + 1, 1)
-                m_total = db.session.query(func.sum(Document.montant_ht)).filter(
-                    Document.type == 'facture',
-                    Document.date >= m_start,
-                    Document.date < m_end,
-                    ~Document.id.in_(avoir_sources)
-                ).scalar() or 0.0
-                
-                # Dépenses (Commandes + Frais)
-                m_cmd = db.session.query(func.sum(Document.montant_ht)).filter(
-                    Document.type == 'bon_de_commande',
-                    Document.date >= m_start,
-                    Document.date < m_end
-                ).scalar() or 0.0
-                
-                m_exp = db.session.query(func.sum(Expense.amount_ht)).filter(
-                    Expense.date >= m_start,
-                    Expense.date < m_end
-                ).scalar() or 0.0
-                
-                labels.append(m_start.strftime('%b'))
-                monthly_data.append(m_total)
-                monthly_expense_data.append(m_cmd + m_exp)
-        else:
-            delta = end_date - start_date
-            step = 1 if delta.days <= 60 else max(1, delta.days // 20)
-            curr = start_date
-            while curr < end_date:
-                next_curr = curr + timedelta(days=step)
-                d_total = db.session.query(func.sum(Document.montant_ht)).filter(
-                    Document.type == 'facture',
-                    Document.date >= curr,
-                    Document.date < next_curr,
-                    ~Document.id.in_(avoir_sources)
-                ).scalar() or 0.0
-                
-                d_expense = db.session.query(func.sum(Document.montant_ht)).filter(
-                    Document.type == 'bon_de_commande',
-                    Document.date >= curr,
-                    Document.date < next_curr
-                ).scalar() or 0.0
-                
-                labels.append(curr.strftime('%d/%m'))
-                monthly_data.append(d_total)
-                monthly_expense_data.append(d_expense)
-                curr = next_curr
-
-        # 5. Statistiques par Client
-        from models import Client
-        client_stats_query = db.session.query(
-            Client.raison_sociale,
-            func.sum(Document.montant_ht).label('total_ht')
-        ).join(Document, Document.client_id == Client.id).filter(
-            Document.type == 'facture',
-            Document.date >= start_date,
-            Document.date < end_date,
-            ~Document.id.in_(avoir_sources)
-        ).group_by(Client.raison_sociale).order_by(func.sum(Document.montant_ht).desc()).limit(10).all()
-
-        client_labels = [row[0] for row in client_stats_query]
-        client_data = [float(row[1]) for row in client_stats_query]
-
-        years = db.session.query(extract('year', Document.date)).filter(Document.type == 'facture').distinct().all()
-        available_years = sorted([int(y[0]) for y in years if y[0]], reverse=True)
-        if datetime.now().year not in available_years:
-            available_years.insert(0, datetime.now().year)
-
-        # 6. Statistiques de Conversion (Performance Commerciale)
-        # Total Devis créés dans la période
-        total_devis = db.session.query(func.count(Document.id)).filter(
-            Document.type == 'devis',
-            Document.date >= start_date,
-            Document.date < end_date
-        ).scalar() or 0
-
-        # Devis convertis (ceux qui ont généré une facture)
-        # On regarde si le devis a un 'generated_documents' de type facture
-        # Note: generated_documents est une relation, mais pour compter efficacement on peut faire une sous-requête ou join
-        # Une facture a source_document_id = id_du_devis
-        
-        # Sous-requête des IDs de devis qui sont source d'une facture
-        converted_ids = db.session.query(Document.source_document_id).filter(
-            Document.type == 'facture',
-            Document.source_document_id.isnot(None)
-        )
-        
-        converted_devis = db.session.query(func.count(Document.id)).filter(
-            Document.type == 'devis',
-            Document.date >= start_date,
-            Document.date < end_date,
-            Document.id.in_(converted_ids)
-        ).scalar() or 0
+    @app.route('/')
+    @login_required
+    def index():
+        from services.settings_registry import get_company_info
+        from services.stats_service import resolve_period
+        info = get_company_info()
         
-        conversion_rate = (converted_devis / total_devis * 100) if total_devis > 0 else 0.0
-
-        return {
-            'total_ht': total_ht,
-            'total_ttc': total_ttc,
-            'total_tva': total_tva,
-            'total_autoliq': total_autoliq,
-            'total_regle': total_regle,
-            'total_impaye': total_impaye,
-            'total_depenses': total_depenses,
-            'total_tva_deductible': total_tva_deductible,
-            'tva_nette': tva_nette,
-            'benefice_net': benefice_net,
-            'monthly_labels': labels,
-            'monthly_data': monthly_data,
-            'monthly_expense_data': monthly_expense_data,
-            'client_labels': client_labels,
-            'client_data': client_data,
+        # Le shell est rendu immédiatement, les chiffres sont chargés via /api/stats
+        year_filter, date_start_str, date_end_str = get_stats_filters()
+        _, _, filter_label, _, current_year = resolve_period(year_filter, date_start_str, date_end_str)
+        filters = {
             'filter_label': filter_label,
-            'available_years': available_years,
-            'current_year': year_filter,
+            'current_year': current_year,
             'start_date': date_start_str,
-            'end_date': date_end_str,
-            'total_devis': total_devis,
-            'converted_devis': converted_devis,
-            'conversion_rate': conversion_rate
+            'end_date': date_end_str
         }
+        return render_template('index.html', info=info, filters=filters)
 
-    @app.route('/')
+    @app.route('/api/stats')
     @login_required
-    def index():
-        from models import CompanyInfo
-        info = CompanyInfo.query.first()
-        stats = get_stats()
-        return render_template('index.html', info=info, stats=stats)
+    def stats_api():
+        import hashlib
+        from services.versioning import get_version
+        from services.stats_cache import STATS_VERSION
+        
+        if not current_user.has_any_role(['admin', 'manager', 'facture_admin']):
+            return jsonify({'error': 'forbidden'}), 403
+        
+        # ETag fort : version des données + filtres + jour (libellés "en cours", années)
+        year_filter, date_start_str, date_end_str = get_stats_filters()
+        version = get_version(STATS_VERSION)
+        raw = f"{version}|{year_filter}|{date_start_str}|{date_end_str}|{datetime.now().date()}"
+        etag = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify(get_stats())
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
 
     @app.route('/export_stats_pdf')
     @login_required
     def export_stats_pdf():
-        from models import CompanyInfo
+        from services.settings_registry import get_company_info
         from xhtml2pdf import pisa
         from io import BytesIO
         from flask import make_response
         from datetime import datetime
         
-        info = CompanyInfo.query.first()
+        info = get_company_info()
         stats = get_stats()
         
         static_root = os.path.join(app.root_path, 'static')
@@ -0,0 +1,43 @@
+import sys
+import time
+from app import create_app
+from extensions import db
+
+app = create_app()
+
+def audit(fix=False, doc_type=None):
+    """
+    Recalcule en masse montant_ht / tva / montant_ttc de tous les documents
+    depuis leurs lignes et affiche les écarts avec les montants stockés.
+    Avec --fix, les montants (et les total_ligne faux) sont corrigés.
+
+    Usage : python audit_totals.py [--fix] [--type=facture]
+    """
+    from services.totals import audit_totals
+
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            report = audit_totals(fix=fix, doc_type=doc_type)
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error: {e}")
+            return
+        elapsed = time.perf_counter() - started
+
+        for row in report['documents'][:50]:
+            print(f"  ⚠️ {row.numero} ({row.type}) : "
+                  f"HT {row.montant_ht or 0:.2f} → {row.expected_ht:.2f}, "
+                  f"TVA {row.tva or 0:.2f} → {row.expected_tva:.2f}, "
+                  f"TTC {row.montant_ttc or 0:.2f} → {row.expected_ttc:.2f}")
+        if len(report['documents']) > 50:
+            print(f"  ... et {len(report['documents']) - 50} autre(s)")
+
+        status = "corrigé(s)" if fix else "en écart"
+        print(f"{'✅' if fix or not report['documents'] else '⚠️'} "
+              f"{len(report['documents'])} document(s) {status}, "
+              f"{report['lines']} ligne(s) avec un total_ligne faux ({elapsed:.2f}s).")
+
+if __name__ == "__main__":
+    doc_type = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--type=')), None)
+    audit(fix='--fix' in sys.argv, doc_type=doc_type)
@@ -0,0 +1,75 @@
+import sys
+import time
+import resource
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Compare les moteurs de rendu PDF (services/pdf_generator.PDF_BACKENDS) sur
+# des documents synthétiques de 1, 20, 200 et 2000 lignes.
+# Chaque mesure tourne dans un processus neuf : le pic de RSS est celui du
+# rendu, pas celui des mesures précédentes.
+#
+# Usage : python benchmark_pdf_backends.py [--backends=xhtml2pdf,reportlab]
+#                                          [--lines=1,20,200,2000] [--repeat=3]
+
+DEFAULT_LINES = [1, 20, 200, 2000]
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ko sous Linux, octets sous macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _measure(backend, line_count, repeat):
+    from services.mock_data import build_synthetic_document, create_benchmark_app
+    from services.pdf_generator import generate_pdf_bytes
+
+    # Base en mémoire, sans planificateur ni pool de pré-rendu
+    app = create_benchmark_app()
+    with app.test_request_context(base_url='http://localhost/'):
+        # Préchauffage : imports tardifs, polices, template compilé
+        generate_pdf_bytes(build_synthetic_document(1), backend=backend)
+        baseline = _peak_rss_mb()
+
+        document = build_synthetic_document(line_count)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            pdf_bytes = generate_pdf_bytes(document, backend=backend)
+            timings.append(time.perf_counter() - started)
+        return {
+            'best': min(timings),
+            'median': statistics.median(timings),
+            'peak_rss': _peak_rss_mb(),
+            'rss_delta': _peak_rss_mb() - baseline,
+            'size': len(pdf_bytes),
+        }
+
+def run(backends, line_counts, repeat):
+    context = multiprocessing.get_context('spawn')
+    print(f"{'Moteur':<12} {'Lignes':>6} {'Meilleur':>10} {'Médiane':>10} "
+          f"{'Pic RSS':>10} {'Δ RSS':>9} {'Taille':>10}")
+    for backend in backends:
+        for line_count in line_counts:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                try:
+                    result = pool.submit(_measure, backend, line_count, repeat).result()
+                except Exception as e:
+                    print(f"{backend:<12} {line_count:>6}  ❌ {e}")
+                    continue
+            print(f"{backend:<12} {line_count:>6} {result['best']:>9.3f}s {result['median']:>9.3f}s "
+                  f"{result['peak_rss']:>7.1f} Mo {result['rss_delta']:>6.1f} Mo "
+                  f"{result['size'] / 1024:>7.1f} ko")
+
+def _option(name, default):
+    for arg in sys.argv[1:]:
+        if arg.startswith(f'--{name}='):
+            return arg.split('=', 1)[1]
+    return default
+
+if __name__ == "__main__":
+    from services.pdf_generator import PDF_BACKENDS
+
+    backends = _option('backends', ','.join(PDF_BACKENDS)).split(',')
+    line_counts = [int(n) for n in _option('lines', ','.join(map(str, DEFAULT_LINES))).split(',')]
+    run(backends, line_counts, int(_option('repeat', 3)))
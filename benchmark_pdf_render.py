@@ -0,0 +1,156 @@
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# Banc de régression du rendu PDF (services/pdf_generator.generate_pdf_bytes).
+# Des documents synthétiques de taille croissante, aux désignations Quill
+# longues (services/mock_data.quill_designation), passent par le vrai
+# template et le filtre clean_html_for_pdf. Chaque étape est chronométrée :
+#   context  : contexte commun (réglages, logo, QR code)
+#   template : rendu Jinja, hors nettoyage HTML
+#   cleanup  : filtre clean_html_for_pdf
+#   layout   : mise en page (xhtml2pdf : mise en page et écriture)
+#   write    : écriture du PDF (WeasyPrint, ReportLab)
+# Les médianes sont comparées à une référence enregistrée : le script sort
+# en erreur (code 1) si une étape dépasse la référence de plus de
+# --tolerance. Tout tourne hors ligne, sur une base SQLite en mémoire.
+#
+# Usage : python benchmark_pdf_render.py [--backends=xhtml2pdf,weasyprint,reportlab]
+#                                        [--lines=1,20,100,400] [--repeat=5]
+#                                        [--tolerance=0.25] [--update-baseline]
+#                                        [--baseline=benchmark_pdf_render_baseline.json]
+
+DEFAULT_LINES = [1, 20, 100, 400]
+STAGES = ['context', 'template', 'cleanup', 'layout', 'write', 'total']
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_pdf_render_baseline.json')
+
+# Écart absolu toujours toléré (bruit de mesure), en secondes
+MIN_REGRESSION = 0.005
+
+_cleanup = {'timings': None}
+
+def _create_app():
+    from services.mock_data import create_benchmark_app
+
+    app = create_benchmark_app()
+
+    # Chronométrage du filtre, déduit ensuite du temps Jinja
+    clean = app.jinja_env.filters['clean_html_for_pdf']
+
+    def timed_clean(html_content):
+        started = time.perf_counter()
+        try:
+            return clean(html_content)
+        finally:
+            timings = _cleanup['timings']
+            if timings is not None:
+                timings['cleanup'] = timings.get('cleanup', 0.0) + time.perf_counter() - started
+
+    app.jinja_env.filters['clean_html_for_pdf'] = timed_clean
+    return app
+
+def _measure(app, backend, line_count, repeat):
+    from services.mock_data import build_synthetic_document
+    from services.pdf_generator import generate_pdf_bytes
+
+    with app.test_request_context(base_url='http://localhost/'):
+        # Préchauffage : imports tardifs, polices, template compilé, QR code
+        generate_pdf_bytes(build_synthetic_document(1, rich=True), backend=backend)
+
+        document = build_synthetic_document(line_count, rich=True)
+        runs = []
+        for _ in range(repeat):
+            timings = {}
+            _cleanup['timings'] = timings
+            started = time.perf_counter()
+            try:
+                generate_pdf_bytes(document, backend=backend, timings=timings)
+            finally:
+                _cleanup['timings'] = None
+            timings['total'] = time.perf_counter() - started
+            if 'template' in timings:
+                timings['template'] -= timings.get('cleanup', 0.0)
+            runs.append(timings)
+    return {stage: statistics.median(run[stage] for run in runs)
+            for stage in STAGES if stage in runs[0]}
+
+def _load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _save_baseline(path, results, repeat):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'machine': platform.node(),
+            'repeat': repeat,
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+def _regressions(key, stages, baseline, tolerance):
+    reference = baseline['results'].get(key) if baseline else None
+    if not reference:
+        return []
+    found = []
+    for stage, value in stages.items():
+        expected = reference.get(stage)
+        if expected is None:
+            continue
+        if value > expected * (1 + tolerance) and value - expected > MIN_REGRESSION:
+            found.append(f"{key} {stage} : {value * 1000:.1f} ms (référence {expected * 1000:.1f} ms)")
+    return found
+
+def run(backends, line_counts, repeat, tolerance, baseline_path, update):
+    baseline = None if update else _load_baseline(baseline_path)
+    if baseline and baseline.get('machine') != platform.node():
+        print(f"⚠️  Référence mesurée sur {baseline.get('machine')}, les écarts peuvent venir de la machine.")
+
+    app = _create_app()
+    results = {}
+    regressions = []
+    print(f"{'Moteur':<12} {'Lignes':>6} " + ' '.join(f"{stage:>9}" for stage in STAGES) + "  (ms, médiane)")
+    for backend in backends:
+        for line_count in line_counts:
+            key = f"{backend}/{line_count}"
+            try:
+                stages = _measure(app, backend, line_count, repeat)
+            except Exception as e:
+                print(f"{backend:<12} {line_count:>6}  ❌ {e}")
+                continue
+            results[key] = stages
+            print(f"{backend:<12} {line_count:>6} " + ' '.join(
+                f"{stages[stage] * 1000:>9.1f}" if stage in stages else f"{'-':>9}" for stage in STAGES))
+            regressions.extend(_regressions(key, stages, baseline, tolerance))
+
+    if update or baseline is None:
+        _save_baseline(baseline_path, results, repeat)
+        print(f"✅ Référence enregistrée dans {baseline_path}.")
+        return True
+    if regressions:
+        print(f"❌ {len(regressions)} étape(s) plus lente(s) que la référence (+{tolerance:.0%}) :")
+        for line in regressions:
+            print(f"   {line}")
+        return False
+    print("✅ Aucune régression.")
+    return True
+
+def _option(name, default):
+    for arg in sys.argv[1:]:
+        if arg.startswith(f'--{name}='):
+            return arg.split('=', 1)[1]
+    return default
+
+if __name__ == "__main__":
+    from services.pdf_generator import PDF_BACKENDS
+
+    backends = _option('backends', ','.join(PDF_BACKENDS)).split(',')
+    line_counts = [int(n) for n in _option('lines', ','.join(map(str, DEFAULT_LINES))).split(',')]
+    ok = run(backends, line_counts, int(_option('repeat', 5)), float(_option('tolerance', 0.25)),
+             _option('baseline', BASELINE_FILE), '--update-baseline' in sys.argv)
+    sys.exit(0 if ok else 1)
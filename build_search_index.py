@@ -0,0 +1,33 @@
+from app import create_app
+from extensions import db
+
+app = create_app()
+
+def build():
+    """
+    Crée les tables FTS5 (document_fts, client_fts) et les remplit depuis
+    Document, LigneDocument, Client et Supplier. Elles sont ensuite tenues
+    à jour à chaque flush. À relancer après des modifications en masse
+    faites hors de l'ORM ; redémarrer l'application après la première
+    création pour que la recherche utilise l'index.
+    """
+    from services.search_index import create_search_tables, rebuild_search_index
+
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            print("❌ FTS5 index requires SQLite: search keeps using ilike.")
+            return
+
+        print("Creating FTS5 tables if needed...")
+        create_search_tables()
+
+        print("🔄 Rebuilding search index...")
+        try:
+            documents, clients = rebuild_search_index()
+            print(f"✅ Search index rebuilt: {documents} documents, {clients} clients.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error: {e}")
+
+if __name__ == "__main__":
+    build()
@@ -13,6 +13,43 @@ class Config:
     PERMANENT_SESSION_LIFETIME = timedelta(minutes=60)
     SESSION_REFRESH_EACH_REQUEST = True
     
+    # Dashboard stats cache (seconds, fallback when no data change is detected)
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL', 300))
+    
+    # Write-behind of User.last_active: at most one UPDATE per user per interval (seconds)
+    ACTIVITY_FLUSH_INTERVAL = int(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 60))
+    
+    # SQL instrumentation (Server-Timing header, slow / repeated query log)
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+    SQL_SLOW_QUERY_MS = int(os.environ.get('SQL_SLOW_QUERY_MS', 200))
+    SQL_REPEAT_THRESHOLD = int(os.environ.get('SQL_REPEAT_THRESHOLD', 5))
+    
+    # Settings registry: max age (seconds) before re-checking the shared 'settings' version
+    SETTINGS_CHECK_INTERVAL = int(os.environ.get('SETTINGS_CHECK_INTERVAL', 5))
+    
+    # Client / supplier picker: max results returned by the search endpoints
+    PICKER_LIMIT = 20
+    
+    # List pages (devis, factures, avoirs, bons de commande): rows per page
+    LIST_PAGE_SIZE = int(os.environ.get('LIST_PAGE_SIZE', 50))
+    LIST_PAGE_SIZE_MAX = 200
+    
+    # Background PDF pre-rendering: worker processes (0 = disabled), max
+    # queued jobs per web process, max wait (seconds) of view_pdf on a job
+    PDF_PRERENDER_WORKERS = int(os.environ.get('PDF_PRERENDER_WORKERS', 2))
+    PDF_PRERENDER_QUEUE_SIZE = int(os.environ.get('PDF_PRERENDER_QUEUE_SIZE', 20))
+    PDF_RENDER_WAIT = float(os.environ.get('PDF_RENDER_WAIT', 10))
+    
+    # Optional on-disk cache of the verification QR codes (PNG), shared by processes
+    QR_CACHE_FOLDER = os.environ.get('QR_CACHE_FOLDER')
+    
+    # Archived PDFs and receipts: hand the transfer to the front proxy after the
+    # permission check ('' = served by Flask, 'x-accel-redirect' = nginx,
+    # 'x-sendfile' = Apache/lighttpd). For nginx, FILE_OFFLOAD_PREFIX is an
+    # `internal` location aliased to UPLOAD_FOLDER.
+    FILE_OFFLOAD = os.environ.get('FILE_OFFLOAD', '').lower()
+    FILE_OFFLOAD_PREFIX = os.environ.get('FILE_OFFLOAD_PREFIX', '/protected-archives/')
+    
     # Backup Configuration
     BACKUP_FOLDER = os.path.join(basedir, 'backups')
     SCHEDULER_API_ENABLED = True
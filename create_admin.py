@@ -27,6 +27,7 @@ def create_admin(username, password):
             user.set_password(password)
             user.roles.append(admin_role)
             db.session.add(user)
+        user.refresh_permissions()
         
         db.session.commit()
         print("Opération réussie !")
@@ -1,7 +1,22 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, SubmitField, IntegerField, FloatField, BooleanField, SelectField, FieldList, FormField, TextAreaField
-from wtforms.validators import DataRequired, Email, Length, Optional, InputRequired
+from wtforms import StringField, SubmitField, IntegerField, FloatField, BooleanField, SelectField, FieldList, FormField, TextAreaField, HiddenField
+from wtforms.validators import DataRequired, Email, Length, Optional, InputRequired, ValidationError
+from extensions import db
+from models import Client, Supplier
+
+class ExistingRecord:
+    """
+    Vérifie que l'id soumis existe dans `model`. Remplace la validation contre
+    la liste complète des choix pour les sélecteurs à recherche (typeahead).
+    """
+    def __init__(self, model, message='Sélection invalide.'):
+        self.model = model
+        self.message = message
+
+    def __call__(self, form, field):
+        if field.data and db.session.get(self.model, field.data) is None:
+            raise ValidationError(self.message)
 
 class ClientForm(FlaskForm):
     raison_sociale = StringField('Raison Sociale / Nom', validators=[DataRequired(), Length(max=100)])
@@ -33,6 +48,8 @@ class LigneDocumentForm(FlaskForm):
     class Meta:
         csrf = False # Embedded forms usually don't need independent CSRF
 
+    # Id of the stored line (empty for a new one): edits are saved as a diff
+    line_id = HiddenField()
     category = SelectField('Type', choices=[
         ('fourniture', 'Fourniture'),
         ('prestation', 'Prestation'),
@@ -48,7 +65,8 @@ class LigneDocumentForm(FlaskForm):
 from wtforms import StringField, SubmitField, IntegerField, FloatField, BooleanField, SelectField, FieldList, FormField, TextAreaField, SelectMultipleField
 
 class DocumentForm(FlaskForm):
-    client_id = SelectField('Client', coerce=int, validators=[DataRequired()])
+    # Choix limités au client sélectionné, la recherche passe par /clients/api/search
+    client_id = SelectField('Client', coerce=int, validators=[DataRequired(), ExistingRecord(Client)], validate_choice=False)
     # Contacts en Copie (CC)
     # Destinataires (Anciennement CC, maintenant destinataires directs)
     cc_contacts = SelectMultipleField('Destinataires', coerce=int, validators=[Optional()], validate_choice=False)
@@ -64,7 +82,7 @@ class DocumentForm(FlaskForm):
     submit = SubmitField('Enregistrer')
 
 class BonCommandeForm(FlaskForm):
-    supplier_id = SelectField('Fournisseur', coerce=int, validators=[DataRequired()])
+    supplier_id = SelectField('Fournisseur', coerce=int, validators=[DataRequired(), ExistingRecord(Supplier)], validate_choice=False)
     date = StringField('Date', validators=[DataRequired()])
     tva_rate = FloatField('Taux TVA (%)', default=20.0, validators=[InputRequired()])
     autoliquidation = BooleanField('Auto-liquidation (Pas de TVA)')
@@ -73,6 +91,12 @@ class BonCommandeForm(FlaskForm):
     lignes = FieldList(FormField(LigneDocumentForm), min_entries=1)
     submit = SubmitField('Enregistrer')
 
+PDF_BACKEND_CHOICES = [
+    ('xhtml2pdf', 'xhtml2pdf (template HTML)'),
+    ('weasyprint', 'WeasyPrint (template HTML)'),
+    ('reportlab', 'ReportLab (mise en page standard, sans template)')
+]
+
 class CompanyInfoForm(FlaskForm):
     nom = StringField('Nom Société', validators=[DataRequired()])
     adresse = StringField('Adresse', validators=[DataRequired()])
@@ -106,4 +130,10 @@ class CompanyInfoForm(FlaskForm):
     ], default='fantita')
     brand_icon = StringField('Icône de la barre de navigation', default='fas fa-tools')
     
+    # PDF rendering engine per document type
+    pdf_backend_devis = SelectField('Devis', choices=PDF_BACKEND_CHOICES, default='xhtml2pdf')
+    pdf_backend_facture = SelectField('Factures', choices=PDF_BACKEND_CHOICES, default='xhtml2pdf')
+    pdf_backend_avoir = SelectField('Avoirs', choices=PDF_BACKEND_CHOICES, default='xhtml2pdf')
+    pdf_backend_bon_de_commande = SelectField('Bons de commande', choices=PDF_BACKEND_CHOICES, default='xhtml2pdf')
+    
     submit = SubmitField('Enregistrer')
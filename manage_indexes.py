@@ -0,0 +1,90 @@
+import sys
+from sqlalchemy import text
+from app import create_app
+from extensions import db
+from models import Document, LigneDocument, Expense, Client, Supplier
+
+app = create_app()
+
+# Requêtes chaudes (listes, dashboard, liens entre documents, notes de frais)
+HOT_QUERIES = {
+    'Liste factures (mois)': """
+        SELECT id FROM document
+        WHERE type = 'facture' AND date >= '2025-01-01' AND date < '2025-02-01'
+        ORDER BY updated_at DESC""",
+    'Liste devis (tout)': """
+        SELECT id FROM document WHERE type = 'devis' ORDER BY updated_at DESC""",
+    'Dashboard (agrégats)': """
+        SELECT type, SUM(montant_ht) FROM document
+        WHERE type IN ('facture', 'bon_de_commande', 'devis')
+          AND date >= '2025-01-01' AND date < '2026-01-01'
+        GROUP BY type""",
+    'Factures avec avoir': """
+        SELECT source_document_id FROM document
+        WHERE type = 'avoir' AND source_document_id IS NOT NULL""",
+    'Documents générés': """
+        SELECT id FROM document WHERE source_document_id = 1""",
+    'Factures non réglées': """
+        SELECT id FROM document WHERE type = 'facture' AND paid = 0 ORDER BY date DESC""",
+    'Documents du client': """
+        SELECT id FROM document WHERE client_id = 1""",
+    'Documents du fournisseur': """
+        SELECT id FROM document WHERE supplier_id = 1""",
+    'Notes de frais (mois)': """
+        SELECT id FROM expense
+        WHERE date >= '2025-01-01' AND date < '2025-02-01' ORDER BY date DESC""",
+    'Notes de frais (utilisateur / catégorie)': """
+        SELECT id FROM expense
+        WHERE created_by_id = 1 AND category = 'transport' ORDER BY date DESC""",
+    'Sélecteur client (préfixe)': """
+        SELECT id FROM client WHERE raison_sociale LIKE 'dup%'
+        ORDER BY raison_sociale COLLATE NOCASE LIMIT 20""",
+}
+
+def explain_all():
+    for label, sql in HOT_QUERIES.items():
+        print(f"  ▸ {label}")
+        rows = db.session.execute(text("EXPLAIN QUERY PLAN " + sql)).fetchall()
+        for row in rows:
+            print(f"      {row[-1]}")
+
+def manage_indexes(explain=True):
+    """
+    Crée les index déclarés dans models.py qui manquent dans la base existante.
+    Idempotent : les index déjà présents sont ignorés.
+    Affiche EXPLAIN QUERY PLAN des requêtes chaudes avant et après.
+    """
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            explain = False
+
+        if explain:
+            print("📋 Plans d'exécution AVANT :")
+            explain_all()
+
+        inspector = db.inspect(db.engine)
+        created = 0
+        for model in (Document, LigneDocument, Expense, Client, Supplier):
+            table = model.__table__
+            existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                if index.name in existing:
+                    print(f"✅ {index.name} existe déjà")
+                    continue
+                print(f"➕ Création de {index.name} ({', '.join(str(e) for e in index.expressions)})")
+                index.create(db.engine, checkfirst=True)
+                created += 1
+
+        if created and db.engine.dialect.name == 'sqlite':
+            # Met à jour les statistiques utilisées par le planificateur
+            with db.engine.begin() as conn:
+                conn.execute(text("ANALYZE"))
+
+        if explain:
+            print("📋 Plans d'exécution APRÈS :")
+            explain_all()
+
+        print(f"✅ Terminé : {created} index créé(s).")
+
+if __name__ == "__main__":
+    manage_indexes(explain='--no-explain' not in sys.argv)
@@ -0,0 +1,56 @@
+import os
+from app import create_app, db
+from models import ArchiveFile, PdfArchive, Document
+
+app = create_app()
+
+# Ancien cache plat (archives/pdf_cache/<empreinte>.pdf)
+LEGACY_CACHE_DIR = 'pdf_cache'
+
+with app.app_context():
+    from services import archive_store
+
+    inspector = db.inspect(db.engine)
+    tables = inspector.get_table_names()
+    for model in (ArchiveFile, PdfArchive):
+        if model.__tablename__ not in tables:
+            print(f"Creating {model.__tablename__} table...")
+            model.__table__.create(db.engine)
+            print(f"Table '{model.__tablename__}' created successfully.")
+        else:
+            print(f"Table '{model.__tablename__}' already exists.")
+
+    # Reprise des PDF déjà en cache : ils sont déplacés dans le magasin sous
+    # la même empreinte, sans nouveau rendu
+    table = Document.__table__
+    rows = db.session.execute(
+        db.select(table.c.id, table.c.pdf_path).where(table.c.pdf_path.like(f'{LEGACY_CACHE_DIR}/%'))
+    ).all()
+    moved = 0
+    for document_id, pdf_path in rows:
+        path = archive_store.absolute_path(pdf_path)
+        key = os.path.splitext(os.path.basename(pdf_path))[0]
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            stored = archive_store.put_bytes(f.read(), '.pdf')
+        if db.session.get(PdfArchive, key) is None:
+            db.session.add(PdfArchive(cache_key=key, document_id=document_id, sha256=stored.sha256))
+        db.session.execute(
+            db.update(table).where(table.c.id == document_id)
+            .values(pdf_path=stored.path, updated_at=table.c.updated_at)
+        )
+        db.session.commit()
+        os.remove(path)
+        moved += 1
+    print(f"{moved} cached PDF(s) moved to the archive store.")
+
+    # Le reste de l'ancien cache n'est plus référencé
+    legacy = archive_store.absolute_path(LEGACY_CACHE_DIR)
+    if os.path.isdir(legacy):
+        for name in os.listdir(legacy):
+            os.remove(os.path.join(legacy, name))
+        os.rmdir(legacy)
+        print(f"Removed {LEGACY_CACHE_DIR}/.")
+
+    print("Migration complete.")
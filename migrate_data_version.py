@@ -0,0 +1,23 @@
+from app import create_app, db
+from models import DataVersion
+
+app = create_app()
+
+with app.app_context():
+    # Check if table exists
+    inspector = db.inspect(db.engine)
+    if 'data_version' not in inspector.get_table_names():
+        print("Creating data_version table...")
+        DataVersion.__table__.create(db.engine)
+        print("Table 'data_version' created successfully.")
+    else:
+        print("Table 'data_version' already exists.")
+
+    # Seed counters
+    for name in ['stats', 'settings']:
+        if not db.session.get(DataVersion, name):
+            db.session.add(DataVersion(name=name, version=0))
+            print(f"Counter '{name}' initialised.")
+    db.session.commit()
+
+    print("Migration complete.")
@@ -0,0 +1,38 @@
+import re
+from app import create_app, db
+from models import Document, DocumentSequence
+
+app = create_app()
+
+NUMERO_RE = re.compile(r'^([A-Z]+)-(\d{4})-(\d+)$')
+
+with app.app_context():
+    # Check if table exists
+    inspector = db.inspect(db.engine)
+    if 'document_sequence' not in inspector.get_table_names():
+        print("Creating document_sequence table...")
+        DocumentSequence.__table__.create(db.engine)
+        print("Table 'document_sequence' created successfully.")
+    else:
+        print("Table 'document_sequence' already exists.")
+
+    # Seed sequences from existing numbers (PREFIX-YEAR-XXXX)
+    maxima = {}
+    for (numero,) in db.session.query(Document.numero):
+        match = NUMERO_RE.match(numero or '')
+        if not match:
+            continue
+        key = (match.group(1), int(match.group(2)))
+        maxima[key] = max(maxima.get(key, 0), int(match.group(3)))
+
+    for (prefix, year), max_value in sorted(maxima.items()):
+        seq = db.session.get(DocumentSequence, (prefix, year))
+        if seq is None:
+            db.session.add(DocumentSequence(prefix=prefix, year=year, last_value=max_value))
+            print(f"Sequence {prefix}-{year} seeded at {max_value}.")
+        elif seq.last_value < max_value:
+            seq.last_value = max_value
+            print(f"Sequence {prefix}-{year} raised to {max_value}.")
+    db.session.commit()
+
+    print("Migration complete.")
@@ -0,0 +1,20 @@
+from app import create_app, db
+from sqlalchemy import text
+
+app = create_app()
+
+COLUMNS = ['pdf_backend_devis', 'pdf_backend_facture', 'pdf_backend_avoir', 'pdf_backend_bon_de_commande']
+
+with app.app_context():
+    print("Migrating CompanyInfo table...")
+    existing = {col['name'] for col in db.inspect(db.engine).get_columns('company_info')}
+    with db.engine.connect() as conn:
+        for column in COLUMNS:
+            if column in existing:
+                print(f"Column '{column}' already exists.")
+                continue
+            conn.execute(text(f"ALTER TABLE company_info ADD COLUMN {column} VARCHAR(20) DEFAULT 'xhtml2pdf'"))
+            print(f"Added '{column}' column to 'company_info' table.")
+        conn.commit()
+
+    print("Migration Check Complete.")
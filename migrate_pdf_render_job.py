@@ -0,0 +1,16 @@
+from app import create_app, db
+from models import PdfRenderJob
+
+app = create_app()
+
+with app.app_context():
+    # Check if table exists
+    inspector = db.inspect(db.engine)
+    if 'pdf_render_job' not in inspector.get_table_names():
+        print("Creating pdf_render_job table...")
+        PdfRenderJob.__table__.create(db.engine)
+        print("Table 'pdf_render_job' created successfully.")
+    else:
+        print("Table 'pdf_render_job' already exists.")
+
+    print("Migration complete.")
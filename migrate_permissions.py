@@ -0,0 +1,24 @@
+from app import create_app, db
+from sqlalchemy import text
+from models import User
+
+app = create_app()
+
+with app.app_context():
+    print("Migrating User table...")
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text("ALTER TABLE user ADD COLUMN permission_mask INTEGER"))
+            conn.commit()
+        print("Successfully added 'permission_mask' column to 'user' table.")
+    except Exception as e:
+        print(f"Error (might already exist): {e}")
+
+    # Compute the permission mask of every user from their roles
+    users = User.query.all()
+    for user in users:
+        user.refresh_permissions()
+    db.session.commit()
+    print(f"Permission masks computed for {len(users)} users.")
+
+    print("Migration Check Complete.")
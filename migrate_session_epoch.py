@@ -0,0 +1,16 @@
+from app import create_app, db
+from sqlalchemy import text
+
+app = create_app()
+
+with app.app_context():
+    print("Migrating User table...")
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text("ALTER TABLE user ADD COLUMN session_epoch INTEGER DEFAULT 0"))
+            conn.commit()
+        print("Successfully added 'session_epoch' column to 'user' table.")
+    except Exception as e:
+        print(f"Error (might already exist): {e}")
+
+    print("Migration Check Complete.")
@@ -1,21 +1,30 @@
 from app import create_app
 from extensions import db
 from models import Document
+from sqlalchemy import select, update, bindparam
 import uuid
 
 app = create_app()
 
+# Documents traités par transaction
+BATCH_SIZE = 1000
+
 with app.app_context():
     print("Checking for documents without secure token...")
-    documents = Document.query.filter_by(secure_token=None).all()
-    
-    if not documents:
+    table = Document.__table__
+    ids = db.session.execute(select(table.c.id).where(table.c.secure_token.is_(None))).scalars().all()
+
+    if not ids:
         print("All documents already have a secure token.")
     else:
-        print(f"Found {len(documents)} documents to update.")
-        for doc in documents:
-            doc.secure_token = str(uuid.uuid4())
-            print(f"Assigning token to Document N°{doc.numero}")
-        
-        db.session.commit()
+        print(f"Found {len(ids)} documents to update.")
+        # UPDATE groupé par lots, updated_at inchangé (pas de badge "Mise à jour")
+        stmt = update(table).where(table.c.id == bindparam('doc_id')).values(
+            secure_token=bindparam('token'), updated_at=table.c.updated_at)
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = ids[start:start + BATCH_SIZE]
+            db.session.execute(stmt, [{'doc_id': doc_id, 'token': str(uuid.uuid4())} for doc_id in batch])
+            db.session.commit()
+            print(f"Assigned tokens to {start + len(batch)}/{len(ids)} documents")
+
         print("Migration completed.")
@@ -1,9 +1,24 @@
 import os
+import uuid
 from datetime import datetime
 from extensions import db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# Un bit de permission par rôle (ordre figé : ne pas réordonner, ajouter à la fin)
+ROLE_NAMES = [
+    'admin', 'manager', 'settings', 'user_admin', 'reporting', 'devis_admin',
+    'facture_admin', 'avoir_admin', 'client_admin', 'supplier_admin', 'access_expenses'
+]
+ROLE_BITS = {name: 1 << index for index, name in enumerate(ROLE_NAMES)}
+
+def role_mask(role_names):
+    """Masque de bits correspondant à une liste de noms de rôles."""
+    mask = 0
+    for name in role_names:
+        mask |= ROLE_BITS.get(name, 0)
+    return mask
+
 # Table d'association pour les rôles multiples
 user_roles = db.Table('user_roles',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
@@ -27,9 +42,12 @@ class User(UserMixin, db.Model):
     last_active = db.Column(db.DateTime)
     current_session_id = db.Column(db.String(36))
     force_logout_at = db.Column(db.DateTime, nullable=True) # Timestamp before which all sessions are invalid
+    session_epoch = db.Column(db.Integer, default=0) # Incremented on login / ejection, compared with session['epoch']
+    permission_mask = db.Column(db.Integer, nullable=True) # ROLE_BITS of the roles, see refresh_permissions()
     
-    # Relation vers les rôles multiples
-    roles = db.relationship('Role', secondary=user_roles, lazy='subquery',
+    # Relation vers les rôles multiples (chargée à la demande : les contrôles
+    # d'accès utilisent permission_mask)
+    roles = db.relationship('Role', secondary=user_roles, lazy='select',
         backref=db.backref('users', lazy=True))
     
     def set_password(self, password):
@@ -38,18 +56,40 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def refresh_permissions(self):
+        """Recalcule permission_mask après une modification des rôles."""
+        self.permission_mask = role_mask(r.name for r in self.roles)
+
+    @property
+    def permissions(self):
+        if self.permission_mask is None:
+            # Utilisateur pas encore migré : calcul depuis les rôles
+            return role_mask(r.name for r in self.roles)
+        return self.permission_mask
+
+    @property
+    def role_names(self):
+        return [name for name in ROLE_NAMES if self.permissions & ROLE_BITS[name]]
+
     def has_role(self, role_name):
-        return any(r.name == role_name for r in self.roles)
+        return bool(self.permissions & ROLE_BITS.get(role_name, 0))
+
+    def has_permission(self, mask):
+        """True si l'utilisateur a l'un des rôles du masque (admin a tous les droits)."""
+        return bool(self.permissions & (mask | ROLE_BITS['admin']))
 
     def has_any_role(self, roles_list):
-        if self.has_role('admin'):
-            return True
-        return any(r.name in roles_list for r in self.roles)
+        return self.has_permission(role_mask(roles_list))
 
     def __repr__(self):
         return f'<User {self.username}>'
 
 class Client(db.Model):
+    # Index insensible à la casse : recherche par préfixe du sélecteur de client
+    __table_args__ = (
+        db.Index('ix_client_raison_sociale_nocase', db.text('raison_sociale COLLATE NOCASE')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     raison_sociale = db.Column(db.String(100), nullable=False)
     adresse = db.Column(db.String(200))
@@ -77,6 +117,10 @@ class Client(db.Model):
         return f'<Client {self.raison_sociale}>'
 
 class Supplier(db.Model):
+    __table_args__ = (
+        db.Index('ix_supplier_raison_sociale_nocase', db.text('raison_sociale COLLATE NOCASE')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     raison_sociale = db.Column(db.String(100), nullable=False)
     adresse = db.Column(db.String(200))
@@ -104,6 +148,16 @@ class Supplier(db.Model):
         return f'<Supplier {self.raison_sociale}>'
 
 class Document(db.Model):
+    # Index couvrant les listes (type + période / tri), les stats et les liens
+    __table_args__ = (
+        db.Index('ix_document_type_date', 'type', 'date'),
+        db.Index('ix_document_type_updated_at', 'type', 'updated_at'),
+        db.Index('ix_document_type_paid', 'type', 'paid'),
+        db.Index('ix_document_source_type', 'source_document_id', 'type'),
+        db.Index('ix_document_client_id', 'client_id'),
+        db.Index('ix_document_supplier_id', 'supplier_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(20), nullable=False) # 'devis', 'facture', 'avoir', 'bon_de_commande'
     numero = db.Column(db.String(50), unique=True, nullable=False)
@@ -138,8 +192,8 @@ class Document(db.Model):
     source_document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=True)
     source_document = db.relationship('Document', remote_side=[id], backref='generated_documents')
     
-    # Token de sécurité pour vérification publique (QR Code)
-    secure_token = db.Column(db.String(36), unique=True, nullable=True)
+    # Token de sécurité pour vérification publique (QR Code), attribué à la création
+    secure_token = db.Column(db.String(36), unique=True, nullable=True, default=lambda: str(uuid.uuid4()))
     
     # Relation avec les lignes
     lignes = db.relationship('LigneDocument', backref='document', lazy=True, cascade="all, delete-orphan")
@@ -176,6 +230,11 @@ class ClientContact(db.Model):
         return f'<Contact {self.nom}>'
 
 class LigneDocument(db.Model):
+    __table_args__ = (
+        # Chargement des lignes d'un document, agrégats de l'audit des totaux
+        db.Index('ix_ligne_document_document_id', 'document_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False)
     
@@ -217,6 +276,12 @@ class CompanyInfo(db.Model):
     theme = db.Column(db.String(50), default='default')
     brand_icon = db.Column(db.String(50), default='fas fa-tools')
 
+    # Moteur de rendu PDF par type de document (services/pdf_generator.PDF_BACKENDS)
+    pdf_backend_devis = db.Column(db.String(20), default='xhtml2pdf')
+    pdf_backend_facture = db.Column(db.String(20), default='xhtml2pdf')
+    pdf_backend_avoir = db.Column(db.String(20), default='xhtml2pdf')
+    pdf_backend_bon_de_commande = db.Column(db.String(20), default='xhtml2pdf')
+
 class AISettings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     enabled = db.Column(db.Boolean, default=True)
@@ -245,6 +310,12 @@ class AISettings(db.Model):
         return settings
 
 class Expense(db.Model):
+    __table_args__ = (
+        db.Index('ix_expense_date', 'date'),
+        db.Index('ix_expense_category_date', 'category', 'date'),
+        db.Index('ix_expense_created_by_date', 'created_by_id', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     description = db.Column(db.String(200), nullable=False)
@@ -291,3 +362,99 @@ class ExpenseAttachment(db.Model):
 
     def __repr__(self):
         return f'<ExpenseAttachment {self.filename}>'
+
+class MonthlyRollup(db.Model):
+    """
+    Agrégats mensuels des documents et notes de frais, maintenus par services/rollup_service.
+    Les factures ayant un avoir associé sont exclues (comme dans le dashboard).
+    """
+    __tablename__ = 'monthly_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('year', 'month', 'doc_type', 'paid', 'autoliquidation', name='uq_monthly_rollup_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    doc_type = db.Column(db.String(20), nullable=False) # 'facture', 'devis', 'avoir', 'bon_de_commande', 'expense'
+    paid = db.Column(db.Boolean, nullable=False, default=False)
+    autoliquidation = db.Column(db.Boolean, nullable=False, default=False)
+
+    montant_ht = db.Column(db.Float, default=0.0)
+    tva = db.Column(db.Float, default=0.0)
+    montant_ttc = db.Column(db.Float, default=0.0)
+    count = db.Column(db.Integer, default=0)
+
+    def __repr__(self):
+        return f'<MonthlyRollup {self.year}-{self.month:02d} {self.doc_type}>'
+
+class DataVersion(db.Model):
+    """
+    Compteurs de version partagés entre les workers (invalidation des caches).
+    Chaque nom ('stats', ...) est incrémenté dans la transaction qui modifie les données.
+    """
+    __tablename__ = 'data_version'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DataVersion {self.name}={self.version}>'
+
+class DocumentSequence(db.Model):
+    """
+    Dernier numéro attribué par (préfixe, année) : F-2025-0042 -> ('F', 2025, 42).
+    Incrémenté dans la transaction de création du document (utils/document.py).
+    """
+    __tablename__ = 'document_sequence'
+    prefix = db.Column(db.String(10), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DocumentSequence {self.prefix}-{self.year}: {self.last_value}>'
+
+class PdfRenderJob(db.Model):
+    """
+    Pré-rendu du PDF d'un document en arrière-plan (services/pdf_prerender.py).
+    Une ligne par document : pending -> running -> done / failed.
+    """
+    __tablename__ = 'pdf_render_job'
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id', ondelete='CASCADE'), primary_key=True)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    error = db.Column(db.Text)
+    enqueued_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<PdfRenderJob {self.document_id} {self.status}>'
+
+class ArchiveFile(db.Model):
+    """
+    Fichier du magasin d'archives (services/archive_store.py), adressé par
+    son contenu : archives/store/<sha[:2]>/<sha[2:4]>/<sha><suffixe>.
+    """
+    __tablename__ = 'archive_file'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(200), nullable=False)  # relatif à UPLOAD_FOLDER
+    size = db.Column(db.Integer, nullable=False)
+    mtime = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ArchiveFile {self.path} ({self.size} o)>'
+
+class PdfArchive(db.Model):
+    """
+    Cache des PDF (services/pdf_cache.py) : empreinte des entrées du rendu
+    -> fichier du magasin d'archives. Plusieurs empreintes peuvent partager
+    le même fichier (contenu identique).
+    """
+    __tablename__ = 'pdf_archive'
+    cache_key = db.Column(db.String(64), primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id', ondelete='CASCADE'), nullable=False, index=True)
+    sha256 = db.Column(db.String(64), db.ForeignKey('archive_file.sha256'), nullable=False, index=True)
+
+    file = db.relationship('ArchiveFile', lazy='joined')
+
+    def __repr__(self):
+        return f'<PdfArchive {self.document_id} {self.cache_key[:12]}>'
@@ -0,0 +1,18 @@
+from app import create_app
+
+app = create_app()
+
+def prune():
+    """
+    Supprime du magasin d'archives (archives/store) les PDF qui ne
+    correspondent plus à aucun document et les fichiers sans entrée.
+    Sans effet sur les PDF à jour.
+    """
+    from services.pdf_cache import prune_pdf_cache
+
+    with app.app_context():
+        removed = prune_pdf_cache()
+        print(f"✅ PDF cache pruned: {removed} file(s) removed.")
+
+if __name__ == "__main__":
+    prune()
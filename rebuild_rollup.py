@@ -0,0 +1,30 @@
+from app import create_app
+from extensions import db
+from models import MonthlyRollup
+
+app = create_app()
+
+def rebuild():
+    """
+    Recalcule entièrement la table monthly_rollup depuis Document et Expense.
+    À lancer après le déploiement (création de la table) ou après des
+    modifications en masse faites hors de l'ORM.
+    """
+    from services.rollup_service import rebuild_rollup
+
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        if 'monthly_rollup' not in inspector.get_table_names():
+            print("Creating monthly_rollup table...")
+            MonthlyRollup.__table__.create(db.engine)
+
+        print("🔄 Rebuilding monthly rollup...")
+        try:
+            written = rebuild_rollup()
+            print(f"✅ Rollup rebuilt: {written} rows written.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error: {e}")
+
+if __name__ == "__main__":
+    rebuild()
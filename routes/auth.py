@@ -1,10 +1,11 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, session
 from flask_login import login_user, logout_user, login_required, current_user
-import uuid
 from datetime import datetime, timedelta
 from extensions import db
 from models import User
 from werkzeug.security import check_password_hash
+from services.activity_tracker import flush_activity, forget
+from services.session_guard import start_session, end_sessions
 
 bp = Blueprint('auth', __name__)
 
@@ -23,14 +24,11 @@ def login():
                 session['temp_user_id'] = user.id
                 return render_template('auth/force_login.html', username=user.username)
             
-            # Normal login
-            new_sid = str(uuid.uuid4())
-            user.current_session_id = new_sid
+            # Normal login (new session epoch: any other session becomes invalid)
+            start_session(user)
             user.last_active = datetime.utcnow()
             db.session.commit()
             
-            session['sid'] = new_sid
-            session['login_at'] = datetime.utcnow() # Track connection time
             login_user(user)
             next_page = request.args.get('next')
             return redirect(next_page or url_for('index'))
@@ -47,13 +45,11 @@ def force_login():
     
     user = User.query.get(user_id)
     if user:
-        new_sid = str(uuid.uuid4())
-        user.current_session_id = new_sid
+        session.pop('temp_user_id', None)
+        start_session(user)
         user.last_active = datetime.utcnow()
         db.session.commit()
         
-        session.pop('temp_user_id', None)
-        session['sid'] = new_sid
         login_user(user)
         flash("Vous avez forcé la déconnexion de l'autre session.", "info")
         return redirect(url_for('index'))
@@ -64,6 +60,7 @@ def force_login():
 @login_required
 def logout():
     # Clear session tracking in DB
+    forget(current_user.id)
     current_user.current_session_id = None
     current_user.last_active = None
     db.session.commit()
@@ -81,6 +78,7 @@ def active_users():
         return redirect(url_for('index'))
         
     # Users active in the last 5 minutes (Real-time view)
+    flush_activity()
     cutoff = datetime.utcnow() - timedelta(minutes=5)
     
     # Filter users who are active AND not ejected after their last activity
@@ -109,10 +107,10 @@ def eject_user(user_id):
         flash("Vous ne pouvez pas vous éjecter vous-même.", "warning")
         return redirect(url_for('auth.active_users'))
         
-    # Invalidate their session by timestamp
-    user.force_logout_at = datetime.utcnow()
+    # Invalidate their sessions (new epoch)
+    forget(user.id)
+    end_sessions(user)
     user.last_active = None # Remove from active list immediately check
-    user.current_session_id = None
     db.session.commit()
     
     flash(f"L'utilisateur {user.username} a été déconnecté.", "success")
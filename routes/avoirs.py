@@ -1,33 +1,38 @@
 from datetime import datetime
-from sqlalchemy import extract
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, Response, stream_with_context
 from extensions import db
 from models import Document, LigneDocument, Client, CompanyInfo, ClientContact
 
 from forms import DocumentForm
 from flask_login import login_required, current_user
 from utils.auth import role_required
-from utils.document import generate_document_number
+from utils.document import generate_document_number, filter_by_period, paginate_keyset
+from services.search_index import document_search
+from utils.lookup import selected_choice
 
 bp = Blueprint('avoirs', __name__)
 
-@bp.route('/')
-@login_required
-@role_required(['admin', 'manager', 'reporting', 'facture_admin'])
-def index():
+def _list_filters():
+    """Search and period filters of the list (current month by default)."""
     q = request.args.get('q')
     month = request.args.get('month')
     year = request.args.get('year')
     
-    now = datetime.now()
-    
     if month is None and year is None and not q:
+        now = datetime.now()
         month = str(now.month)
         year = str(now.year)
-        
+    return q, month, year
+
+def _filtered_query(q, month, year):
+    """Credit notes matching the list filters, and the relevance subquery (or None)."""
     query = Document.query.filter(Document.type == 'avoir')
 
-    if q:
+    # Full-text index (ranked by relevance); ilike fallback without FTS5
+    ranked = document_search(q) if q else None
+    if ranked is not None:
+        query = query.join(ranked, ranked.c.id == Document.id)
+    elif q:
         search = f"%{q}%"
         SourceDoc = db.aliased(Document)
         query = query.join(Client).outerjoin(SourceDoc, Document.source_document).filter(
@@ -37,13 +42,20 @@ def index():
             (SourceDoc.numero.ilike(search)))
         )
     
-    if month and month != 'all':
-        query = query.filter(extract('month', Document.date) == int(month))
-    
-    if year and year != 'all':
-        query = query.filter(extract('year', Document.date) == int(year))
+    return filter_by_period(query, month, year), ranked
 
-    documents = query.order_by(Document.updated_at.desc()).all()
+@bp.route('/')
+@login_required
+@role_required(['admin', 'manager', 'reporting', 'facture_admin'])
+def index():
+    q, month, year = _list_filters()
+    now = datetime.now()
+    query, ranked = _filtered_query(q, month, year)
+
+    documents, next_cursor = paginate_keyset(query, request.args.get('after'),
+                                             request.args.get('per_page', type=int),
+                                             sort=ranked.c.score if ranked is not None else None,
+                                             ascending=ranked is not None)
 
     months = [
         {'value': '1', 'label': 'Janvier'}, {'value': '2', 'label': 'Février'}, 
@@ -60,7 +72,20 @@ def index():
                            months=months, years=years,
                            selected_month=month if month else 'all',
                            selected_year=year if year else 'all',
-                           current_year=current_year_int)
+                           current_year=current_year_int,
+                           next_cursor=next_cursor)
+
+@bp.route('/export')
+@login_required
+@role_required(['admin', 'manager', 'reporting', 'facture_admin'])
+def export():
+    """ZIP of the PDFs of the listed credit notes, streamed while missing PDFs render."""
+    from services.pdf_export import stream_pdf_zip
+    q, month, year = _list_filters()
+    query, _ = _filtered_query(q, month, year)
+    period = '-'.join(v for v in (year, month) if v and v != 'all') or 'tout'
+    return Response(stream_with_context(stream_pdf_zip(query)), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="avoirs_{period}.zip"'})
 
 @bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -94,7 +119,7 @@ def edit(id):
     # So we must NOT use populate_obj blindly or we reset fields.
     
     form = DocumentForm(obj=document)
-    form.client_id.choices = [(c.id, c.raison_sociale) for c in Client.query.order_by(Client.raison_sociale).all()]
+    form.client_id.choices = selected_choice(Client, form.client_id.data)
 
     if request.method == 'GET':
         if document.date:
@@ -105,10 +130,6 @@ def edit(id):
             form.cc_contacts.data = [c.id for c in document.cc_contacts]
 
     if form.validate_on_submit():
-        # Supprimer l'ancien PDF pour régénération
-        from services.pdf_generator import delete_old_pdf
-        delete_old_pdf(document)
-
         # ONLY UPDATE THE DATE
         document.date = datetime.strptime(form.date.data, '%Y-%m-%d')
         
@@ -192,8 +213,7 @@ def convert_from_facture(id):
         return redirect(url_for('avoirs.index'))
          
     year = datetime.now().year
-    count = Document.query.filter(Document.numero.like(f'A-{year}-%')).count()
-    numero = f'A-{year}-{count + 1:04d}'
+    numero = generate_document_number('A', year)
     
     avoir = Document(
         type='avoir',
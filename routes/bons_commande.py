@@ -1,12 +1,15 @@
 from datetime import datetime
-from sqlalchemy import extract
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort
 from extensions import db
-from models import Document, LigneDocument, Supplier, CompanyInfo
+from models import Document, Supplier
+from services.settings_registry import get_company_info
 from forms import BonCommandeForm
 from flask_login import login_required, current_user
 from utils.auth import role_required
-from utils.document import generate_document_number
+from utils.document import generate_document_number, filter_by_period, paginate_keyset, sync_lines, fill_line_ids, lines_from_forms
+from services.totals import apply_totals
+from services.search_index import document_search
+from utils.lookup import selected_choice
 
 bp = Blueprint('bons_commande', __name__)
 
@@ -25,7 +28,11 @@ def index():
         
     query = Document.query.filter(Document.type == 'bon_de_commande')
 
-    if q:
+    # Full-text index (ranked by relevance); ilike fallback without FTS5
+    ranked = document_search(q) if q else None
+    if ranked is not None:
+        query = query.join(ranked, ranked.c.id == Document.id)
+    elif q:
         search = f"%{q}%"
         query = query.join(Supplier).filter(
             ((Document.numero.ilike(search)) |
@@ -33,13 +40,12 @@ def index():
             (db.cast(Document.date, db.String).ilike(search)))
         )
         
-    if month and month != 'all':
-        query = query.filter(extract('month', Document.date) == int(month))
-    
-    if year and year != 'all':
-        query = query.filter(extract('year', Document.date) == int(year))
+    query = filter_by_period(query, month, year)
 
-    documents = query.order_by(Document.updated_at.desc()).all()
+    documents, next_cursor = paginate_keyset(query, request.args.get('after'),
+                                             request.args.get('per_page', type=int),
+                                             sort=ranked.c.score if ranked is not None else None,
+                                             ascending=ranked is not None)
 
     months = [
         {'value': '1', 'label': 'Janvier'}, {'value': '2', 'label': 'Février'}, 
@@ -56,14 +62,15 @@ def index():
                            months=months, years=years,
                            selected_month=month if month else 'all',
                            selected_year=year if year else 'all',
-                           current_year=current_year_int)
+                           current_year=current_year_int,
+                           next_cursor=next_cursor)
 
 @bp.route('/add', methods=['GET', 'POST'])
 @login_required
 @role_required(['admin', 'manager', 'facture_admin', 'supplier_admin'])
 def add():
     form = BonCommandeForm()
-    form.supplier_id.choices = [(s.id, s.raison_sociale) for s in Supplier.query.order_by(Supplier.raison_sociale).all()]
+    form.supplier_id.choices = selected_choice(Supplier, form.supplier_id.data)
 
     if form.validate_on_submit():
         year = datetime.now().year
@@ -82,24 +89,9 @@ def add():
             updated_by_id=current_user.id
         )
         
-        total_ht = 0
-        for ligne_form in form.lignes:
-            l = LigneDocument(
-                designation=ligne_form.designation.data,
-                quantite=ligne_form.quantite.data,
-                prix_unitaire=ligne_form.prix_unitaire.data,
-                total_ligne=ligne_form.quantite.data * ligne_form.prix_unitaire.data,
-                category=ligne_form.category.data
-            )
-            total_ht += l.total_ligne
-            document.lignes.append(l)
-        
-        document.montant_ht = total_ht
-        if document.autoliquidation:
-            document.tva = 0
-        else:
-            document.tva = total_ht * (document.tva_rate / 100)
-        document.montant_ttc = document.montant_ht + document.tva
+        # Calcul des totaux et ajout des lignes
+        document.lignes = lines_from_forms(form.lignes)
+        apply_totals(document)
         
         db.session.add(document)
         db.session.commit()
@@ -111,7 +103,7 @@ def add():
         
     # Default TVA from Company Settings
     if request.method == 'GET' and not form.tva_rate.data:
-        info = CompanyInfo.query.first()
+        info = get_company_info()
         if info:
             form.tva_rate.data = info.tva_default
         
@@ -126,16 +118,13 @@ def edit(id):
         abort(403)
         
     form = BonCommandeForm(obj=document)
-    form.supplier_id.choices = [(s.id, s.raison_sociale) for s in Supplier.query.order_by(Supplier.raison_sociale).all()]
+    form.supplier_id.choices = selected_choice(Supplier, form.supplier_id.data)
 
     if request.method == 'GET':
         form.date.data = document.date.strftime('%Y-%m-%d')
+        fill_line_ids(form, document)
 
     if form.validate_on_submit():
-        # Supprimer l'ancien PDF pour régénération
-        from services.pdf_generator import delete_old_pdf
-        delete_old_pdf(document)
-
         document.date = datetime.strptime(form.date.data, '%Y-%m-%d')
         document.supplier_id = form.supplier_id.data
         document.autoliquidation = form.autoliquidation.data
@@ -144,29 +133,9 @@ def edit(id):
         document.chantier_reference = form.chantier_reference.data
         document.updated_by_id = current_user.id
         
-        # Update lines
-        # Clear existing lines
-        for ligne in document.lignes:
-            db.session.delete(ligne)
-        
-        total_ht = 0
-        for ligne_form in form.lignes:
-            l = LigneDocument(
-                designation=ligne_form.designation.data,
-                quantite=ligne_form.quantite.data,
-                prix_unitaire=ligne_form.prix_unitaire.data,
-                total_ligne=ligne_form.quantite.data * ligne_form.prix_unitaire.data,
-                category=ligne_form.category.data
-            )
-            total_ht += l.total_ligne
-            document.lignes.append(l)
-            
-        document.montant_ht = total_ht
-        if document.autoliquidation:
-            document.tva = 0
-        else:
-            document.tva = total_ht * (document.tva_rate / 100)
-        document.montant_ttc = document.montant_ht + document.tva
+        # Update lines: only the added, modified and removed ones are written
+        total_ht = sync_lines(document, form.lignes)
+        apply_totals(document, total_ht)
         
         db.session.commit()
         flash(f'Bon de commande {document.numero} mis à jour.', 'success')
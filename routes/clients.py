@@ -6,6 +6,8 @@ from forms import ClientForm
 from sqlalchemy.exc import IntegrityError
 from flask_login import login_required, current_user
 from utils.auth import role_required
+from services.search_index import client_search
+from utils.lookup import search_by_name
 
 bp = Blueprint('clients', __name__)
 
@@ -14,7 +16,13 @@ bp = Blueprint('clients', __name__)
 @role_required(['admin', 'manager', 'client_admin'])
 def index():
     q = request.args.get('q')
-    if q:
+    ranked = client_search(q) if q else None
+    if ranked is not None:
+        # Full-text index, best matches first
+        clients = Client.query.join(ranked, ranked.c.id == Client.id).order_by(
+            ranked.c.score.asc(), Client.raison_sociale.asc()
+        ).all()
+    elif q:
         search = f"%{q}%"
         clients = Client.query.outerjoin(ClientContact).filter(
             (Client.raison_sociale.ilike(search)) | 
@@ -161,6 +169,15 @@ def delete(id):
         
     return redirect(url_for('clients.index'))
 
+@bp.route('/api/search')
+@login_required
+# Roles of the document forms using the picker (devis, factures, avoirs)
+@role_required(['admin', 'manager', 'devis_admin', 'facture_admin', 'client_admin'])
+def search_api():
+    """Autocomplétion du sélecteur de client (préfixe de la raison sociale)."""
+    clients = search_by_name(Client, request.args.get('q'), request.args.get('limit', type=int))
+    return {'results': [{'id': c.id, 'label': c.raison_sociale, 'ville': c.ville} for c in clients]}
+
 @bp.route('/api/client/<int:client_id>/contacts')
 @login_required
 def get_contacts(client_id):
@@ -1,13 +1,16 @@
 from datetime import datetime
-from sqlalchemy import extract
 from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
 from extensions import db
-from models import Document, LigneDocument, Client, CompanyInfo, ClientContact
+from models import Document, LigneDocument, Client, ClientContact
+from services.settings_registry import get_company_info
 
 from forms import DocumentForm
 from flask_login import login_required, current_user
 from utils.auth import role_required
-from utils.document import generate_document_number
+from utils.document import generate_document_number, filter_by_period, paginate_keyset, sync_lines, fill_line_ids, lines_from_forms
+from services.totals import apply_totals
+from services.search_index import document_search
+from utils.lookup import selected_choice
 
 bp = Blueprint('devis', __name__)
 
@@ -30,8 +33,11 @@ def index():
         
     query = Document.query.join(Client).filter(Document.type == 'devis')
 
-    # Apply Search
-    if q:
+    # Apply Search: full-text index (ranked by relevance), ilike fallback without FTS5
+    ranked = document_search(q) if q else None
+    if ranked is not None:
+        query = query.join(ranked, ranked.c.id == Document.id)
+    elif q:
         search = f"%{q}%"
         query = query.filter(
             (Document.numero.ilike(search)) |
@@ -39,14 +45,13 @@ def index():
             (db.cast(Document.date, db.String).ilike(search))
         )
     
-    # Apply Date Filters
-    if month and month != 'all':
-        query = query.filter(extract('month', Document.date) == int(month))
-    
-    if year and year != 'all':
-        query = query.filter(extract('year', Document.date) == int(year))
+    # Apply Date Filters (date bounds, index friendly)
+    query = filter_by_period(query, month, year)
 
-    documents = query.order_by(Document.updated_at.desc()).all()
+    documents, next_cursor = paginate_keyset(query, request.args.get('after'),
+                                             request.args.get('per_page', type=int),
+                                             sort=ranked.c.score if ranked is not None else None,
+                                             ascending=ranked is not None)
     
     # Data for filter dropdowns
     months = [
@@ -68,15 +73,16 @@ def index():
                            years=years, 
                            selected_month=month if month else 'all', 
                            selected_year=year if year else 'all',
-                           current_year=current_year_int)
+                           current_year=current_year_int,
+                           next_cursor=next_cursor)
 
 @bp.route('/add', methods=['GET', 'POST'])
 @login_required
 @role_required(['admin', 'manager', 'devis_admin'])
 def add():
     form = DocumentForm()
-    # Populate client choices
-    form.client_id.choices = [(c.id, c.raison_sociale) for c in Client.query.order_by(Client.raison_sociale).all()]
+    # Only the selected client is rendered, the picker searches /clients/api/search
+    form.client_id.choices = selected_choice(Client, form.client_id.data)
 
     if form.validate_on_submit():
         year = datetime.now().year
@@ -109,28 +115,8 @@ def add():
                 document.cc_contacts = contacts
         
         # Calcul des totaux et ajout des lignes
-        total_ht = 0
-        for ligne_form in form.lignes:
-            # Handle None values
-            qte = ligne_form.quantite.data if ligne_form.quantite.data is not None else 0.0
-            prix = ligne_form.prix_unitaire.data if ligne_form.prix_unitaire.data is not None else 0.0
-            
-            l = LigneDocument(
-                designation=ligne_form.designation.data,
-                quantite=qte,
-                prix_unitaire=prix,
-                total_ligne=qte * prix,
-                category=ligne_form.category.data
-            )
-            total_ht += l.total_ligne
-            document.lignes.append(l)
-        
-        document.montant_ht = total_ht
-        if document.autoliquidation:
-            document.tva = 0
-        else:
-            document.tva = total_ht * (document.tva_rate / 100)
-        document.montant_ttc = document.montant_ht + document.tva
+        document.lignes = lines_from_forms(form.lignes)
+        apply_totals(document)
         
         db.session.add(document)
         db.session.commit()
@@ -143,7 +129,7 @@ def add():
         
     # Default TVA from Company Settings
     if request.method == 'GET' and not form.tva_rate.data:
-        info = CompanyInfo.query.first()
+        info = get_company_info()
         if info:
             form.tva_rate.data = info.tva_default
     
@@ -162,7 +148,7 @@ def edit(id):
         return redirect(url_for('devis.index'))
 
     form = DocumentForm(obj=document)
-    form.client_id.choices = [(c.id, c.raison_sociale) for c in Client.query.order_by(Client.raison_sociale).all()]
+    form.client_id.choices = selected_choice(Client, form.client_id.data)
 
     if request.method == 'GET':
         # Pre-populate date correctly (string format for date input)
@@ -173,11 +159,9 @@ def edit(id):
         if document.cc_contacts:
             form.cc_contacts.data = [c.id for c in document.cc_contacts]
 
+        fill_line_ids(form, document)
+
     if form.validate_on_submit():
-        # Supprimer l'ancien PDF car le document va être modifié
-        from services.pdf_generator import delete_old_pdf
-        delete_old_pdf(document)
-        
         document.client_id = form.client_id.data
         
         # Handle optional Primary Contact - REMOVED
@@ -199,31 +183,9 @@ def edit(id):
         document.updated_by_id = current_user.id
         document.updated_at = datetime.utcnow()
         
-        # Update lines: Clear old ones and add new ones
-        document.lignes = [] 
-        
-        total_ht = 0
-        for ligne_form in form.lignes:
-            # Handle None values
-            qte = ligne_form.quantite.data if ligne_form.quantite.data is not None else 0.0
-            prix = ligne_form.prix_unitaire.data if ligne_form.prix_unitaire.data is not None else 0.0
-            
-            l = LigneDocument(
-                designation=ligne_form.designation.data,
-                quantite=qte,
-                prix_unitaire=prix,
-                total_ligne=qte * prix,
-                category=ligne_form.category.data
-            )
-            total_ht += l.total_ligne
-            document.lignes.append(l)
-        
-        document.montant_ht = total_ht
-        if document.autoliquidation:
-            document.tva = 0
-        else:
-            document.tva = total_ht * (document.tva_rate / 100)
-        document.montant_ttc = document.montant_ht + document.tva
+        # Update lines: only the added, modified and removed ones are written
+        total_ht = sync_lines(document, form.lignes)
+        apply_totals(document, total_ht)
         
         db.session.commit()
         flash(f'Devis {document.numero} modifié avec succès.', 'success')
@@ -1,8 +1,11 @@
-from flask import Blueprint, send_from_directory, current_app, abort
+from flask import Blueprint, abort
 from extensions import db
 from models import Document
-from services.pdf_generator import generate_pdf
-import os
+from services.archive_store import content_hash
+from services.pdf_cache import get_cached_pdf, pdf_is_cached
+from services.pdf_export import export_filename
+from services.pdf_prerender import wait_for_render
+from utils.file_serving import send_upload
 
 from flask_login import login_required
 
@@ -13,13 +16,15 @@ bp = Blueprint('documents', __name__)
 def view_pdf(id):
     document = Document.query.get_or_404(id)
     
-    # Generate if not exists
-    if not document.pdf_path or not os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], document.pdf_path)):
-        try:
-            filename = generate_pdf(document)
-        except Exception as e:
-            return f"Erreur lors de la génération du PDF : {str(e)}", 500
-    else:
-        filename = document.pdf_path
+    # Served from the PDF cache, rendered only if the document changed.
+    # A pre-render in progress is awaited rather than duplicated.
+    try:
+        if not pdf_is_cached(document):
+            wait_for_render(document.id)
+        filename = get_cached_pdf(document)
+    except Exception as e:
+        return f"Erreur lors de la génération du PDF : {str(e)}", 500
         
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+    # Strong ETag from the stored content hash: repeat views get a 304
+    return send_upload(filename, etag=content_hash(filename), mimetype='application/pdf',
+                       download_name=export_filename(document))
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_from_directory, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify
 from flask_login import login_required, current_user
 from extensions import db
 from models import Expense, Supplier
@@ -6,6 +6,7 @@ from datetime import datetime
 import os
 from werkzeug.utils import secure_filename
 from utils.auth import role_required
+from utils.file_serving import send_upload
 
 bp = Blueprint('expenses', __name__)
 
@@ -202,7 +203,8 @@ def allowed_file(filename):
 @login_required
 @role_required(['access_expenses'])
 def get_receipt(filename):
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+    # Conditional GET and Range, or handed to the front proxy (FILE_OFFLOAD)
+    return send_upload(filename)
 
 @bp.route('/')
 @login_required
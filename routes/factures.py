@@ -1,33 +1,40 @@
 from datetime import datetime
-from sqlalchemy import extract
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort, Response, stream_with_context
 from extensions import db
-from models import Document, LigneDocument, Client, CompanyInfo, ClientContact
+from models import Document, LigneDocument, Client, ClientContact
+from services.settings_registry import get_company_info
 
 from forms import DocumentForm
 from flask_login import login_required, current_user
 from utils.auth import role_required
-from utils.document import generate_document_number
+from utils.document import generate_document_number, filter_by_period, paginate_keyset, sync_lines, fill_line_ids, lines_from_forms
+from services.totals import apply_totals
+from services.search_index import document_search
+from utils.lookup import selected_choice
 
 bp = Blueprint('factures', __name__)
 
-@bp.route('/')
-@login_required
-@role_required(['admin', 'manager', 'reporting', 'facture_admin'])
-def index():
+def _list_filters():
+    """Search and period filters of the list (current month by default)."""
     q = request.args.get('q')
     month = request.args.get('month')
     year = request.args.get('year')
     
-    now = datetime.now()
-    
     if month is None and year is None and not q:
+        now = datetime.now()
         month = str(now.month)
         year = str(now.year)
-        
+    return q, month, year
+
+def _filtered_query(q, month, year):
+    """Invoices matching the list filters, and the relevance subquery (or None)."""
     query = Document.query.filter(Document.type == 'facture')
 
-    if q:
+    # Full-text index (ranked by relevance); ilike fallback without FTS5
+    ranked = document_search(q) if q else None
+    if ranked is not None:
+        query = query.join(ranked, ranked.c.id == Document.id)
+    elif q:
         from sqlalchemy.orm import aliased
         SourceDocument = aliased(Document)
         search = f"%{q}%"
@@ -38,13 +45,20 @@ def index():
             (db.cast(Document.date, db.String).ilike(search)))
         )
     
-    if month and month != 'all':
-        query = query.filter(extract('month', Document.date) == int(month))
-    
-    if year and year != 'all':
-        query = query.filter(extract('year', Document.date) == int(year))
+    return filter_by_period(query, month, year), ranked
+
+@bp.route('/')
+@login_required
+@role_required(['admin', 'manager', 'reporting', 'facture_admin'])
+def index():
+    q, month, year = _list_filters()
+    now = datetime.now()
+    query, ranked = _filtered_query(q, month, year)
 
-    documents = query.order_by(Document.updated_at.desc()).all()
+    documents, next_cursor = paginate_keyset(query, request.args.get('after'),
+                                             request.args.get('per_page', type=int),
+                                             sort=ranked.c.score if ranked is not None else None,
+                                             ascending=ranked is not None)
     
     months = [
         {'value': '1', 'label': 'Janvier'}, {'value': '2', 'label': 'Février'}, 
@@ -61,15 +75,28 @@ def index():
                            months=months, years=years,
                            selected_month=month if month else 'all',
                            selected_year=year if year else 'all',
-                           current_year=current_year_int)
+                           current_year=current_year_int,
+                           next_cursor=next_cursor)
+
+@bp.route('/export')
+@login_required
+@role_required(['admin', 'manager', 'reporting', 'facture_admin'])
+def export():
+    """ZIP of the PDFs of the listed invoices, streamed while missing PDFs render."""
+    from services.pdf_export import stream_pdf_zip
+    q, month, year = _list_filters()
+    query, _ = _filtered_query(q, month, year)
+    period = '-'.join(v for v in (year, month) if v and v != 'all') or 'tout'
+    return Response(stream_with_context(stream_pdf_zip(query)), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="factures_{period}.zip"'})
 
 @bp.route('/add', methods=['GET', 'POST'])
 @login_required
 @role_required(['admin', 'manager', 'facture_admin'])
 def add():
     form = DocumentForm()
-    # Populate client choices
-    form.client_id.choices = [(c.id, c.raison_sociale) for c in Client.query.order_by(Client.raison_sociale).all()]
+    # Only the selected client is rendered, the picker searches /clients/api/search
+    form.client_id.choices = selected_choice(Client, form.client_id.data)
 
     if form.validate_on_submit():
         year = datetime.now().year
@@ -98,28 +125,8 @@ def add():
                 document.cc_contacts = contacts
         
         # Calcul des totaux et ajout des lignes
-        total_ht = 0
-        for ligne_form in form.lignes:
-            # Handle None values
-            qte = ligne_form.quantite.data if ligne_form.quantite.data is not None else 0.0
-            prix = ligne_form.prix_unitaire.data if ligne_form.prix_unitaire.data is not None else 0.0
-            
-            l = LigneDocument(
-                designation=ligne_form.designation.data,
-                quantite=qte,
-                prix_unitaire=prix,
-                total_ligne=qte * prix,
-                category=ligne_form.category.data
-            )
-            total_ht += l.total_ligne
-            document.lignes.append(l)
-        
-        document.montant_ht = total_ht
-        if document.autoliquidation:
-            document.tva = 0
-        else:
-            document.tva = total_ht * (document.tva_rate / 100)
-        document.montant_ttc = document.montant_ht + document.tva
+        document.lignes = lines_from_forms(form.lignes)
+        apply_totals(document)
         
         db.session.add(document)
         db.session.commit()
@@ -133,7 +140,7 @@ def add():
         
     # Default TVA from Company Settings
     if request.method == 'GET' and not form.tva_rate.data:
-        info = CompanyInfo.query.first()
+        info = get_company_info()
         if info:
             form.tva_rate.data = info.tva_default
     
@@ -149,7 +156,7 @@ def edit(id):
         return redirect(url_for('factures.index'))
 
     form = DocumentForm(obj=document)
-    form.client_id.choices = [(c.id, c.raison_sociale) for c in Client.query.order_by(Client.raison_sociale).all()]
+    form.client_id.choices = selected_choice(Client, form.client_id.data)
 
     if request.method == 'GET':
         # Pre-populate date correctly
@@ -160,11 +167,9 @@ def edit(id):
         if document.cc_contacts:
             form.cc_contacts.data = [c.id for c in document.cc_contacts]
 
+        fill_line_ids(form, document)
+
     if form.validate_on_submit():
-        # Supprimer l'ancien PDF car le document va être modifié
-        from services.pdf_generator import delete_old_pdf
-        delete_old_pdf(document)
-        
         document.client_id = form.client_id.data
         
         # Handle CC Contacts
@@ -192,31 +197,9 @@ def edit(id):
         document.updated_by_id = current_user.id
         document.updated_at = datetime.utcnow()
         
-        # Update lines: Clear old ones and add new ones
-        document.lignes = [] 
-        
-        total_ht = 0
-        for ligne_form in form.lignes:
-            # Handle None values
-            qte = ligne_form.quantite.data if ligne_form.quantite.data is not None else 0.0
-            prix = ligne_form.prix_unitaire.data if ligne_form.prix_unitaire.data is not None else 0.0
-            
-            l = LigneDocument(
-                designation=ligne_form.designation.data,
-                quantite=qte,
-                prix_unitaire=prix,
-                total_ligne=qte * prix,
-                category=ligne_form.category.data
-            )
-            total_ht += l.total_ligne
-            document.lignes.append(l)
-        
-        document.montant_ht = total_ht
-        if document.autoliquidation:
-            document.tva = 0
-        else:
-            document.tva = total_ht * (document.tva_rate / 100)
-        document.montant_ttc = document.montant_ht + document.tva
+        # Update lines: only the added, modified and removed ones are written
+        total_ht = sync_lines(document, form.lignes)
+        apply_totals(document, total_ht)
         
         db.session.commit()
         
@@ -334,7 +317,6 @@ def convert_from_devis(id):
             # Show form to enter client reference
             from forms import DocumentForm
             form = DocumentForm()
-            form.client_id.choices = [(c.id, c.raison_sociale) for c in Client.query.order_by(Client.raison_sociale).all()]
             return render_template('factures/convert_form.html', form=form, devis=devis, title="Convertir Devis en Facture")
         
         # POST: Process the conversion
@@ -347,18 +329,12 @@ def convert_from_devis(id):
         # --- NEW: Cleanup old invoices to avoid duplicates ---
         old_invoices = Document.query.filter_by(type='facture', source_document_id=id).all()
         if old_invoices:
-            import os
             for old_inv in old_invoices:
                 # Skip deletion if the invoice is locked (Paid, Sent, or Linked to Avoir)
                 if old_inv.paid or old_inv.sent_at or old_inv.generated_documents:
                     continue
     
-                # Delete associated PDF file if it exists
-                if old_inv.pdf_path and os.path.exists(old_inv.pdf_path):
-                    try:
-                        os.remove(old_inv.pdf_path)
-                    except Exception as e:
-                        print(f"Could not delete old PDF {old_inv.pdf_path}: {e}")
+                # The cached PDF is removed by the pdf_cache listener on commit
                 db.session.delete(old_inv)
             db.session.commit()
         # ---------------------------------------------------
@@ -5,6 +5,7 @@ from models import Supplier
 from forms import SupplierForm
 from flask_login import login_required, current_user
 from utils.auth import role_required
+from utils.lookup import search_by_name
 
 bp = Blueprint('fournisseurs', __name__)
 
@@ -76,3 +77,12 @@ def delete(id):
     db.session.commit()
     flash('Fournisseur supprimé avec succès.', 'success')
     return redirect(url_for('fournisseurs.index'))
+
+@bp.route('/api/search')
+@login_required
+# Roles of the bon de commande form using the picker
+@role_required(['admin', 'manager', 'supplier_admin', 'facture_admin'])
+def search_api():
+    """Autocomplétion du sélecteur de fournisseur (préfixe de la raison sociale)."""
+    suppliers = search_by_name(Supplier, request.args.get('q'), request.args.get('limit', type=int))
+    return {'results': [{'id': s.id, 'label': s.raison_sociale, 'ville': s.ville} for s in suppliers]}
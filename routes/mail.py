@@ -1,9 +1,10 @@
 from flask import Blueprint, flash, redirect, url_for, request, current_app
 from flask_login import login_required, current_user
 from extensions import db
-from models import Document, CompanyInfo
+from models import Document
+from services.settings_registry import get_company_info
 from services.mail_service import send_email_with_attachment
-from services.pdf_generator import generate_pdf_bytes
+from services.pdf_cache import get_cached_pdf_bytes
 import os
 
 bp = Blueprint('mail', __name__)
@@ -28,7 +29,7 @@ def send_document(id):
         from flask import abort
         return abort(403)
 
-    info = CompanyInfo.query.first()
+    info = get_company_info()
     
     # Update CC Contacts if provided in form (Generic 'recipient_ids' from Modal)
     if request.method == 'POST' and 'recipient_ids' in request.form:
@@ -72,8 +73,8 @@ def send_document(id):
         return redirect(url_for('settings.index'))
 
     try:
-        # 1. Générer le PDF en mémoire
-        pdf_bytes = generate_pdf_bytes(doc)
+        # 1. Récupérer le PDF (cache, rendu seulement si le document a changé)
+        pdf_bytes = get_cached_pdf_bytes(doc)
         
         # 2. Préparer l'email (Format HTML avec Signature)
         doc_type_display = "Bon de Commande" if doc.type == 'bon_de_commande' else doc.type.title()
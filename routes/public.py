@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, abort
-from models import Document, CompanyInfo
+from models import Document
+from services.settings_registry import get_company_info
 from extensions import db
 
 bp = Blueprint('public', __name__)
@@ -7,7 +8,7 @@ bp = Blueprint('public', __name__)
 @bp.route('/verify/<token>')
 def verify(token):
     document = Document.query.filter_by(secure_token=token).first_or_404()
-    info = CompanyInfo.query.first()
+    info = get_company_info()
     
     return render_template('public/verify_document.html', document=document, info=info)
 
@@ -6,6 +6,7 @@ from extensions import db
 from models import CompanyInfo, AISettings, User
 from forms import CompanyInfoForm
 from utils.auth import role_required
+from services.settings_registry import get_company_info, commit_settings
 
 bp = Blueprint('settings', __name__, url_prefix='/settings')
 
@@ -23,7 +24,7 @@ def company():
     if not info:
         info = CompanyInfo(nom="STP Gestion", adresse="", cp="", ville="", ville_signature="")
         db.session.add(info)
-        db.session.commit()
+        commit_settings()
     
     form = CompanyInfoForm(obj=info)
     
@@ -40,7 +41,7 @@ def company():
             f.save(os.path.join(upload_path, new_filename))
             info.logo_path = f'uploads/{new_filename}'
         
-        db.session.commit()
+        commit_settings()
         flash('Paramètres société mis à jour.', 'success')
         return redirect(url_for('settings.company'))
 
@@ -57,7 +58,7 @@ def ai():
         ai_settings.provider = request.form.get('provider')
         ai_settings.api_key = request.form.get('api_key')
         ai_settings.model_name = request.form.get('model_name')
-        db.session.commit()
+        commit_settings()
         flash('Paramètres de l\'assistant mis à jour.', 'success')
         return redirect(url_for('settings.ai'))
         
@@ -138,7 +139,7 @@ def template_preview():
     html_content = request.form.get('content')
     from services.mock_data import get_mock_document
     doc = get_mock_document()
-    info = CompanyInfo.query.first()
+    info = get_company_info()
     from flask import render_template_string
     try:
         return render_template_string(html_content, document=doc, info=info)
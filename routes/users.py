@@ -33,6 +33,7 @@ def add():
             if role_ids:
                 selected_roles = Role.query.filter(Role.id.in_(role_ids)).all()
                 user.roles = selected_roles
+            user.refresh_permissions()
             
             db.session.add(user)
             db.session.commit()
@@ -57,6 +58,7 @@ def edit(id):
             user.roles = selected_roles
         else:
             user.roles = []
+        user.refresh_permissions()
             
         password = request.form.get('password')
         if password:
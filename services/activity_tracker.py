@@ -0,0 +1,59 @@
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import update, bindparam
+from extensions import db
+from models import User
+
+# Tampon en mémoire de la dernière activité des utilisateurs (par processus).
+# Une requête authentifiée ne fait qu'enregistrer l'heure ; la colonne
+# User.last_active est écrite au plus une fois toutes les
+# ACTIVITY_FLUSH_INTERVAL secondes par utilisateur, en un seul UPDATE groupé.
+_lock = threading.Lock()
+_pending = {}       # user_id -> dernière activité non écrite
+_last_flush = {}    # user_id -> heure de la dernière écriture
+
+def touch(user_id, now=None):
+    """Enregistre l'activité d'un utilisateur ; écrit les entrées échues."""
+    now = now or datetime.utcnow()
+    interval = current_app.config.get('ACTIVITY_FLUSH_INTERVAL', 60)
+    with _lock:
+        _pending[user_id] = now
+        last = _last_flush.get(user_id)
+        due = last is None or (now - last).total_seconds() >= interval
+    if due:
+        flush_activity(now=now, interval=interval)
+
+def forget(user_id):
+    """Oublie l'activité en attente (déconnexion, éjection)."""
+    with _lock:
+        _pending.pop(user_id, None)
+        _last_flush.pop(user_id, None)
+
+def flush_activity(now=None, interval=0):
+    """
+    Écrit les activités en attente depuis au moins `interval` secondes
+    (toutes par défaut) et valide la transaction. Une session déconnectée
+    entre-temps (current_session_id vidé) n'est pas ranimée.
+    """
+    now = now or datetime.utcnow()
+    with _lock:
+        rows = []
+        for user_id, seen in list(_pending.items()):
+            last = _last_flush.get(user_id)
+            if last is None or (now - last).total_seconds() >= interval:
+                rows.append({'uid': user_id, 'seen': seen})
+                del _pending[user_id]
+                _last_flush[user_id] = now
+    if not rows:
+        return 0
+
+    table = User.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.id == bindparam('uid'), table.c.current_session_id.isnot(None))
+        .values(last_active=bindparam('seen')),
+        rows
+    )
+    db.session.commit()
+    return len(rows)
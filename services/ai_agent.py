@@ -1,7 +1,7 @@
 import os
 import json
 from datetime import datetime
-from models import AISettings
+from services.settings_registry import get_ai_settings
 
 class AIAgent:
     def __init__(self):
@@ -13,7 +13,7 @@ class AIAgent:
         """Reload settings from DB and re-initialize provider."""
         from extensions import db
         try:
-            self.settings = AISettings.get_settings()
+            self.settings = get_ai_settings()
             if not self.settings.enabled:
                 self.provider = None
                 return
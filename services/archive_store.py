@@ -0,0 +1,138 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, delete
+from extensions import db
+from models import ArchiveFile
+
+# Magasin d'archives adressé par contenu. Chaque fichier est rangé sous
+# archives/store/<sha[:2]>/<sha[2:4]>/<sha><suffixe> : deux niveaux de 256
+# sous-dossiers gardent chaque dossier petit, et un contenu identique n'est
+# écrit qu'une fois. La table archive_file (taille, sha256, date) fait foi :
+# savoir si un fichier existe est une lecture par clé primaire, sans accès
+# disque. Les fichiers ne sont jamais modifiés après écriture, ce qui rend
+# les sauvegardes incrémentales (rsync) triviales.
+STORE_DIR = 'store'
+
+# Fichier temporaire abandonné (processus tué pendant l'écriture)
+STALE_TMP_SECONDS = 3600
+
+def relative_path(sha256, suffix=''):
+    """Chemin (relatif à UPLOAD_FOLDER) du fichier de contenu `sha256`."""
+    return os.path.join(STORE_DIR, sha256[:2], sha256[2:4], f"{sha256}{suffix}")
+
+def content_hash(path):
+    """sha256 d'un fichier du magasin, lu dans son chemin."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+def absolute_path(path):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], path)
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def put_bytes(data, suffix=''):
+    """
+    Range `data` dans le magasin et retourne son ArchiveFile (ajouté à la
+    session, le commit reste à la charge de l'appelant). Un contenu déjà
+    présent n'est pas réécrit, sauf si son fichier a disparu.
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    entry = db.session.get(ArchiveFile, sha256)
+    if entry is not None:
+        if not os.path.exists(absolute_path(entry.path)):
+            _write_atomic(absolute_path(entry.path), data)
+        return entry
+    path = relative_path(sha256, suffix)
+    _write_atomic(absolute_path(path), data)
+    entry = ArchiveFile(sha256=sha256, path=path, size=len(data), mtime=datetime.utcnow())
+    db.session.add(entry)
+    return entry
+
+def read_bytes(entry):
+    with open(absolute_path(entry.path), 'rb') as f:
+        return f.read()
+
+def remove_files(paths):
+    """Supprime des fichiers du magasin (après le commit qui a retiré leurs lignes)."""
+    for path in paths:
+        try:
+            os.remove(absolute_path(path))
+        except OSError:
+            pass
+
+def delete_entries(sha256s, connection=None):
+    """Retire les lignes données ; retourne les chemins à supprimer après commit."""
+    if not sha256s:
+        return []
+    conn = connection if connection is not None else db.session
+    table = ArchiveFile.__table__
+    paths = conn.execute(select(table.c.path).where(table.c.sha256.in_(list(sha256s)))).scalars().all()
+    conn.execute(delete(table).where(table.c.sha256.in_(list(sha256s))))
+    return paths
+
+def verify_store(deep=False):
+    """
+    Contrôle d'intégrité : fichiers manquants, de taille différente ou (deep)
+    dont le sha256 ne correspond plus. Retourne la liste des sha256 en défaut.
+    """
+    bad = []
+    for entry in db.session.execute(select(ArchiveFile)).scalars():
+        path = absolute_path(entry.path)
+        try:
+            if os.path.getsize(path) != entry.size:
+                bad.append(entry.sha256)
+                continue
+        except OSError:
+            bad.append(entry.sha256)
+            continue
+        if deep:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            if digest.hexdigest() != entry.sha256:
+                bad.append(entry.sha256)
+    return bad
+
+def sweep_orphan_files():
+    """
+    Supprime les fichiers du magasin sans ligne dans archive_file et les
+    fichiers temporaires abandonnés. Retourne le nombre de fichiers supprimés.
+    """
+    root = absolute_path(STORE_DIR)
+    if not os.path.isdir(root):
+        return 0
+    known = set(db.session.execute(select(ArchiveFile.path)).scalars())
+    now = time.time()
+    removed = 0
+    for level1 in os.scandir(root):
+        if not level1.is_dir():
+            continue
+        for level2 in os.scandir(level1.path):
+            if not level2.is_dir():
+                continue
+            for item in os.scandir(level2.path):
+                relative = os.path.join(STORE_DIR, level1.name, level2.name, item.name)
+                if item.name.endswith('.tmp'):
+                    if now - item.stat().st_mtime < STALE_TMP_SECONDS:
+                        continue
+                elif relative in known:
+                    continue
+                os.remove(item.path)
+                removed += 1
+    return removed
@@ -3,7 +3,9 @@ from datetime import datetime
 from flask import url_for, request
 from flask_login import current_user
 from extensions import db
-from models import Client, Supplier, Document, LigneDocument, CompanyInfo, ClientContact
+from models import Client, Supplier, Document, LigneDocument, ClientContact
+from services.settings_registry import get_company_info
+from services.totals import apply_totals, line_total
 from sqlalchemy import func
 
 logger = logging.getLogger(__name__)
@@ -204,8 +206,8 @@ class ChatExecutor:
         prefix_map = {'devis': 'D', 'facture': 'F', 'avoir': 'A', 'bon_de_commande': 'BC'}
         prefix = prefix_map.get(doc_type, 'DOC')
         
-        count = Document.query.filter(Document.numero.like(f'{prefix}-{year}-%')).count()
-        return f'{prefix}-{year}-{count + 1:04d}'
+        from utils.document import generate_document_number
+        return generate_document_number(prefix, year)
 
     def create_document(self, data):
         """
@@ -234,7 +236,7 @@ class ChatExecutor:
         doc_date = datetime.strptime(date_str, '%Y-%m-%d') if date_str else datetime.now()
 
         # Defaults
-        info = CompanyInfo.query.first()
+        info = get_company_info()
         default_tva = info.tva_default if info else 20.0
         
         doc = Document(
@@ -289,7 +291,7 @@ class ChatExecutor:
             designation=data['designation'],
             quantite=qty,
             prix_unitaire=price,
-            total_ligne=qty * price,
+            total_ligne=line_total(qty, price),
             category=data.get('category', 'fourniture')
         )
         db.session.add(line)
@@ -405,13 +407,7 @@ class ChatExecutor:
         }
 
     def _recalculate_document(self, doc):
-        total_ht = sum(l.total_ligne for l in doc.lignes)
-        doc.montant_ht = total_ht
-        if doc.autoliquidation:
-            doc.tva = 0
-        else:
-            doc.tva = total_ht * (doc.tva_rate / 100)
-        doc.montant_ttc = doc.montant_ht + doc.tva
+        apply_totals(doc)
 
     def calculate_totals(self, data):
          return self.add_line(data)
@@ -468,39 +464,23 @@ class ChatExecutor:
             Document.source_document_id.isnot(None)
         ).subquery()
 
-        # 2. Main Queries
-        def get_totals(doc_type, filters=None):
-            q_ht = db.session.query(func.sum(Document.montant_ht)).filter(Document.type == doc_type)
-            q_tva = db.session.query(func.sum(Document.tva)).filter(Document.type == doc_type)
-            q_ttc = db.session.query(func.sum(Document.montant_ttc)).filter(Document.type == doc_type)
-            q_count = db.session.query(func.count(Document.id)).filter(Document.type == doc_type)
-            
-            if start_date:
-                q_ht = q_ht.filter(Document.date >= start_date)
-                q_tva = q_tva.filter(Document.date >= start_date)
-                q_ttc = q_ttc.filter(Document.date >= start_date)
-                q_count = q_count.filter(Document.date >= start_date)
-
-            if doc_type == 'facture':
-                q_ht = q_ht.filter(~Document.id.in_(avoir_sources))
-                q_tva = q_tva.filter(~Document.id.in_(avoir_sources))
-                q_ttc = q_ttc.filter(~Document.id.in_(avoir_sources))
-                q_count = q_count.filter(~Document.id.in_(avoir_sources))
-            
-            if filters == 'paid':
-                q_ttc = q_ttc.filter(Document.paid == True)
-            
-            return {
-                "ht": q_ht.scalar() or 0.0,
-                "tva": q_tva.scalar() or 0.0,
-                "ttc": q_ttc.scalar() or 0.0,
-                "count": q_count.scalar() or 0
+        # 2. Main Totals (read from the monthly rollup, which already excludes credited invoices)
+        from services.rollup_service import read_rollup
+        totals = {}
+        for doc_type, ht, tva, ttc, ttc_paid, _autoliq, count in read_rollup(since=start_date):
+            totals[doc_type] = {
+                "ht": ht or 0.0,
+                "tva": tva or 0.0,
+                "ttc": ttc or 0.0,
+                "paid_ttc": ttc_paid or 0.0,
+                "count": count or 0
             }
 
-        factures = get_totals('facture')
-        factures_paid = get_totals('facture', filters='paid')
-        devis = get_totals('devis')
-        bons_commande = get_totals('bon_de_commande')
+        empty = {"ht": 0.0, "tva": 0.0, "ttc": 0.0, "paid_ttc": 0.0, "count": 0}
+        factures = totals.get('facture', empty)
+        factures_paid = {"ttc": factures['paid_ttc']}
+        devis = totals.get('devis', empty)
+        bons_commande = totals.get('bon_de_commande', empty)
         
         # Performance Commerciale (Conversion)
         # Using the same logic as app.py: how many Devis in this period became a Facture
@@ -721,13 +701,13 @@ class ChatExecutor:
         if not recipient_emails:
             return {"status": "error", "message": "Aucune adresse email spécifiée et aucune adresse par défaut trouvée."}
             
-        from services.pdf_generator import generate_pdf_bytes
+        from services.pdf_cache import get_cached_pdf_bytes
         from services.mail_service import send_email_with_attachment
         import os
         
         try:
-            pdf_bytes = generate_pdf_bytes(doc)
-            info = CompanyInfo.query.first()
+            pdf_bytes = get_cached_pdf_bytes(doc)
+            info = get_company_info()
             doc_type_display = "Bon de Commande" if doc.type == 'bon_de_commande' else doc.type.title()
             subject = f"{doc_type_display} n°{doc.numero} - {info.nom if info else 'STP'}"
             
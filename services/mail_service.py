@@ -2,14 +2,14 @@ import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
-from models import CompanyInfo
+from services.settings_registry import get_company_info
 
 def send_email_with_attachment(to_email, subject, body, attachment_content, attachment_filename, cc_emails=None):
     """
     Envoie un email avec une pièce jointe en utilisant les réglages SMTP de la base de données.
     cc_emails: Liste d'adresses email en copie
     """
-    settings = CompanyInfo.query.first()
+    settings = get_company_info()
     if not settings or not settings.smtp_server:
         raise Exception("Configuration SMTP manquante dans les paramètres de la société.")
 
@@ -31,3 +31,88 @@ class MockDocument:
 
 def get_mock_document():
     return MockDocument()
+
+# Documents synthétiques (benchmarks de rendu PDF) : aucun accès à la base
+_CATEGORIES = ['fourniture', 'fourniture', 'fourniture', 'main_doeuvre', 'prestation', 'texte_libre']
+
+def quill_designation(index, paragraphs=3):
+    """Désignation longue telle que produite par l'éditeur Quill (paragraphes, listes, mises en forme)."""
+    parts = [f"<p><strong>Lot {index + 1}</strong> : fourniture et pose d'un réseau cuivre "
+             f"<em>Ø{12 + index % 10}</em> avec raccords à sertir.</p>"]
+    for i in range(paragraphs):
+        parts.append(
+            f"<p>Étape {i + 1} : dépose de l'existant, reprise des   supports et <u>essais d'étanchéité</u>"
+            f" sous 6 bars.<br></p>"
+        )
+        parts.append(
+            "<ul><li>Canalisations <strong>cuivre</strong> écroui</li>"
+            f"<li class=\"ql-indent-1\">Colliers isophoniques x{2 + i}</li>"
+            "<li>Calorifugeage &amp; repérage</li></ul>"
+        )
+    parts.append("<p><span style=\"color: rgb(230, 0, 0);\">Garantie décennale.</span>\n\n</p>")
+    return ''.join(parts)
+
+class SyntheticLigne:
+    def __init__(self, index, rich=False):
+        self.category = _CATEGORIES[index % len(_CATEGORIES)]
+        if rich:
+            self.designation = quill_designation(index)
+        else:
+            self.designation = f"<p>Article {index + 1} : tube cuivre <b>Ø{12 + index % 10}</b> et raccords</p>"
+        self.quantite = float(1 + index % 7)
+        self.prix_unitaire = round(10 + (index * 37) % 500 + 0.5, 2)
+        self.total_ligne = self.quantite * self.prix_unitaire
+
+def build_synthetic_document(line_count, doc_type='facture', rich=False):
+    """
+    Document complet en mémoire avec `line_count` lignes, prêt à être rendu.
+    `rich` : désignations longues au format Quill (quill_designation).
+    """
+    from types import SimpleNamespace
+    lignes = [SyntheticLigne(i, rich) for i in range(line_count)]
+    montant_ht = sum(l.total_ligne for l in lignes)
+    return SimpleNamespace(
+        id=0, numero=f"BENCH-{doc_type.upper()}-{line_count:05d}", type=doc_type,
+        date=datetime(2025, 1, 15), client=MockClient(), supplier=MockClient(),
+        source_document=None, cc_contacts=[], lignes=lignes,
+        montant_ht=montant_ht, tva_rate=20.0, tva=montant_ht * 0.2, montant_ttc=montant_ht * 1.2,
+        autoliquidation=False, client_reference="REF-CLIENT", chantier_reference="Chantier Démo",
+        validity_duration=1, secure_token="00000000-0000-4000-8000-000000000000",
+    )
+
+# Logo de démonstration (static/), pour que le contexte prépare une vraie image
+SAMPLE_LOGO = 'uploads/logo.jpg'
+
+def create_benchmark_app():
+    """
+    Application jetable pour les benchmarks de rendu PDF : base SQLite en
+    mémoire avec des Paramètres société synthétiques, sans pool de pré-rendu,
+    planificateur ni sauvegardes. Ni la base ni les dossiers de production
+    ne sont touchés.
+    """
+    import os
+    from config import Config
+    from app import create_app
+    from extensions import db
+    from models import CompanyInfo
+    from services.settings_registry import commit_settings
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        PDF_PRERENDER_WORKERS = 0
+        QR_CACHE_FOLDER = None
+        SQL_INSTRUMENTATION = False
+
+    app = create_app(BenchmarkConfig, background_jobs=False)
+    with app.app_context():
+        db.create_all()
+        logo = SAMPLE_LOGO if os.path.exists(os.path.join(app.root_path, 'static', SAMPLE_LOGO)) else None
+        db.session.add(CompanyInfo(
+            nom="Service Température Plomberie", adresse="1 rue du Banc d'Essai", cp="93100",
+            ville="Montreuil", ville_signature="Montreuil", telephone="01 23 45 67 89",
+            email="contact@example.com", conditions_reglement="<p>30 jours <strong>fin de mois</strong></p>",
+            iban="FR76 0000 0000 0000 0000 0000 000", logo_path=logo,
+            footer_info="<p>SARL au capital de 10 000 € - SIRET 000 000 000 00000</p>",
+        ))
+        commit_settings()
+    return app
@@ -0,0 +1,106 @@
+import base64
+import hashlib
+import os
+import re
+import threading
+from collections import namedtuple
+from io import BytesIO
+from flask import current_app
+
+# Ressources statiques du rendu PDF, préparées une fois par processus :
+# - le logo, réduit et réencodé en PNG puis embarqué en data URI (xhtml2pdf
+#   et WeasyPrint ne rouvrent plus le fichier), ou en ImageReader (ReportLab) ;
+# - la feuille de style de pdf_template.html, analysée une fois pour
+#   WeasyPrint avec une configuration de polices partagée.
+# Le logo est rechargé quand CompanyInfo.logo_path ou le fichier changent,
+# la feuille de style quand le CSS du template change.
+
+# Largeur max du logo préparé (affiché en 120px, marge pour l'impression)
+LOGO_MAX_WIDTH = 600
+
+Logo = namedtuple('Logo', 'path data_uri png')
+
+_STYLE_RE = re.compile(r'<style[^>]*>(.*?)</style>', re.S | re.I)
+
+_lock = threading.Lock()
+_logo = {'key': None, 'value': None, 'reader': None}
+_styles = {'key': None, 'value': None}
+
+def _prepare_logo(path):
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.load()
+        if img.width > LOGO_MAX_WIDTH:
+            img = img.resize((LOGO_MAX_WIDTH, round(img.height * LOGO_MAX_WIDTH / img.width)), Image.LANCZOS)
+        if img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            img = img.convert('RGBA')
+        out = BytesIO()
+        img.save(out, format='PNG', optimize=True)
+    return out.getvalue()
+
+def get_logo(logo_path):
+    """Logo préparé (chemin, data URI, octets PNG) ou None si absent."""
+    if not logo_path:
+        return None
+    path = os.path.join(current_app.root_path, 'static', logo_path)
+    try:
+        key = (path, os.path.getmtime(path))
+    except OSError:
+        return None
+    with _lock:
+        if _logo['key'] == key:
+            return _logo['value']
+    png = _prepare_logo(path)
+    value = Logo(path, 'data:image/png;base64,' + base64.b64encode(png).decode('ascii'), png)
+    with _lock:
+        _logo.update(key=key, value=value, reader=None)
+    return value
+
+def logo_image_reader(logo):
+    """ImageReader ReportLab du logo, décodé une seule fois."""
+    from reportlab.lib.utils import ImageReader
+
+    with _lock:
+        if _logo['value'] is logo and _logo['reader'] is not None:
+            return _logo['reader']
+    reader = ImageReader(BytesIO(logo.png))
+    with _lock:
+        if _logo['value'] is logo:
+            _logo['reader'] = reader
+    return reader
+
+def split_styles(html_string):
+    """Sépare le HTML rendu de ses blocs <style> : (html sans style, css)."""
+    css_text = '\n'.join(_STYLE_RE.findall(html_string))
+    return _STYLE_RE.sub('', html_string), css_text
+
+def weasyprint_stylesheet(css_text):
+    """(CSS analysé, FontConfiguration) pour WeasyPrint, réutilisés tant que le CSS est le même."""
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    key = hashlib.sha256(css_text.encode('utf-8')).hexdigest()
+    with _lock:
+        if _styles['key'] == key:
+            return _styles['value']
+    font_config = FontConfiguration()
+    value = (CSS(string=css_text, font_config=font_config), font_config)
+    with _lock:
+        _styles.update(key=key, value=value)
+    return value
+
+def warm_pdf_assets():
+    """
+    Prépare le logo et, si un type de document utilise WeasyPrint, la
+    feuille de style (au démarrage d'un worker de rendu, dans un contexte d'application).
+    """
+    from services.settings_registry import get_company_info
+
+    info = get_company_info()
+    if info:
+        get_logo(info.logo_path)
+    if info and 'weasyprint' in (getattr(info, column, None) for column in info._fields if column.startswith('pdf_backend_')):
+        template_path = os.path.join(current_app.root_path, 'templates', 'pdf_template.html')
+        with open(template_path, encoding='utf-8') as f:
+            weasyprint_stylesheet(split_styles(f.read())[1])
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import threading
+from flask import current_app, url_for
+from sqlalchemy import event, update, select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from extensions import db
+from models import Document, PdfArchive, ArchiveFile
+from services import archive_store
+from services.versioning import get_version
+from services.settings_registry import SETTINGS_VERSION
+
+# Cache des PDF : l'empreinte d'un document couvre tout ce qui entre dans le
+# rendu (champs du document, lignes, tiers, contacts, version des réglages,
+# version du template). La table pdf_archive associe chaque empreinte à un
+# fichier du magasin d'archives (services/archive_store) : vérifier qu'un PDF
+# est à jour est une lecture par clé primaire, sans accès disque. Un PDF dont
+# l'empreinte ne correspond plus est remplacé au prochain accès : aucune
+# route n'a besoin de l'invalider.
+TEMPLATE = 'pdf_template.html'
+
+# À incrémenter quand le rendu change sans que le template change (contexte, moteur)
+RENDER_VERSION = 1
+
+# Colonnes sans effet sur le rendu
+_IGNORED = {'pdf_path', 'paid', 'sent_at', 'created_at', 'updated_at',
+            'created_by_id', 'updated_by_id', 'date_creation'}
+
+_lock = threading.Lock()
+_template_state = {}
+
+def _columns(obj):
+    if obj is None:
+        return None
+    return {column.key: getattr(obj, column.key)
+            for column in obj.__table__.columns if column.key not in _IGNORED}
+
+def _template_version():
+    """Empreinte du template PDF, relue seulement quand le fichier change."""
+    path = os.path.join(current_app.root_path, 'templates', TEMPLATE)
+    mtime = os.path.getmtime(path)
+    with _lock:
+        if _template_state.get('mtime') != mtime:
+            with open(path, 'rb') as f:
+                _template_state['digest'] = hashlib.sha256(f.read()).hexdigest()
+            _template_state['mtime'] = mtime
+        return _template_state['digest']
+
+def pdf_cache_key(document):
+    """Empreinte SHA-256 des entrées du rendu PDF de `document`."""
+    from services.pdf_generator import backend_for
+
+    source = document.source_document
+    payload = {
+        'render': RENDER_VERSION,
+        'backend': backend_for(document).name,
+        'template': _template_version(),
+        'settings': get_version(SETTINGS_VERSION),
+        'document': _columns(document),
+        'lignes': [_columns(ligne) for ligne in document.lignes],
+        'client': _columns(document.client),
+        'supplier': _columns(document.supplier),
+        'contacts': sorted((c.id, c.nom, c.email) for c in document.cc_contacts),
+        'source': source.numero if source else None,
+        # Le QR code encode l'URL publique de vérification
+        'verify_url': url_for('public.verify', token=document.secure_token, _external=True)
+            if document.secure_token else None,
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _release(connection, sha256s):
+    """
+    Retire du magasin les fichiers `sha256s` qui ne sont plus référencés par
+    aucune entrée du cache. Retourne les chemins à supprimer après commit.
+    """
+    if not sha256s:
+        return []
+    table = PdfArchive.__table__
+    still_used = set(connection.execute(
+        select(table.c.sha256).where(table.c.sha256.in_(list(sha256s)))).scalars())
+    return archive_store.delete_entries(set(sha256s) - still_used, connection)
+
+def _evict(connection, document_id, keep_key=None):
+    """Retire les autres versions du PDF de `document_id` ; retourne les fichiers à supprimer."""
+    table = PdfArchive.__table__
+    condition = table.c.document_id == document_id
+    if keep_key is not None:
+        condition &= table.c.cache_key != keep_key
+    old = set(connection.execute(select(table.c.sha256).where(condition)).scalars())
+    if not old:
+        return []
+    connection.execute(delete(table).where(condition))
+    return _release(connection, old)
+
+def _store(document, key, pdf_bytes):
+    stored = archive_store.put_bytes(pdf_bytes, '.pdf')
+    db.session.add(PdfArchive(cache_key=key, document_id=document.id, sha256=stored.sha256))
+    db.session.flush()
+    obsolete = _evict(db.session, document.id, keep_key=key)
+    _store_path(document, stored.path)
+    archive_store.remove_files(obsolete)
+
+def _store_path(document, relative_path):
+    # Mise à jour silencieuse : ni updated_at ni listeners ORM
+    table = Document.__table__
+    db.session.execute(
+        update(table).where(table.c.id == document.id)
+        .values(pdf_path=relative_path, updated_at=table.c.updated_at)
+    )
+    db.session.commit()
+    set_committed_value(document, 'pdf_path', relative_path)
+
+def _lookup(key):
+    # Lecture directe : une entrée en identity map peut avoir été évincée par un autre processus
+    return db.session.execute(
+        select(ArchiveFile.path).join(PdfArchive, PdfArchive.sha256 == ArchiveFile.sha256)
+        .where(PdfArchive.cache_key == key)
+    ).scalar()
+
+def pdf_is_cached(document):
+    """True si le PDF à jour de `document` est déjà dans le cache."""
+    return _lookup(pdf_cache_key(document)) is not None
+
+def get_cached_pdf(document):
+    """
+    Retourne le chemin du PDF de `document` (relatif à UPLOAD_FOLDER), en le
+    générant si le cache ne contient pas la version à jour. Les anciennes
+    versions sont retirées du magasin.
+    """
+    from services.pdf_generator import generate_pdf_bytes
+
+    key = pdf_cache_key(document)
+    relative_path = _lookup(key)
+    if relative_path is None:
+        pdf_bytes = generate_pdf_bytes(document)
+        try:
+            _store(document, key, pdf_bytes)
+        except IntegrityError:
+            # Un autre worker a enregistré le même rendu entre-temps
+            db.session.rollback()
+        relative_path = _lookup(key)
+        if relative_path is None:
+            raise RuntimeError(f"PDF de {document.numero} introuvable dans le magasin d'archives")
+
+    if document.pdf_path != relative_path:
+        _store_path(document, relative_path)
+    return relative_path
+
+def forget_pdfs(sha256s):
+    """Retire du cache les entrées pointant vers des fichiers perdus ou corrompus."""
+    if not sha256s:
+        return
+    table = PdfArchive.__table__
+    db.session.execute(delete(table).where(table.c.sha256.in_(list(sha256s))))
+    paths = archive_store.delete_entries(sha256s)
+    db.session.commit()
+    archive_store.remove_files(paths)
+
+def get_cached_pdf_bytes(document):
+    """Octets du PDF de `document`, lus depuis le magasin (pour l'envoi par email)."""
+    path = get_cached_pdf(document)
+    try:
+        with open(archive_store.absolute_path(path), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        # Fichier perdu (restauration partielle, suppression manuelle) : nouveau rendu
+        forget_pdfs([archive_store.content_hash(path)])
+        with open(archive_store.absolute_path(get_cached_pdf(document)), 'rb') as f:
+            return f.read()
+
+def prune_pdf_cache():
+    """
+    Retire du cache les entrées des documents supprimés hors ORM, puis du
+    magasin les fichiers qui ne sont plus référencés et les fichiers sans
+    ligne (écritures interrompues). Retourne le nombre de fichiers supprimés.
+    """
+    table = PdfArchive.__table__
+    documents = Document.__table__
+    orphans = select(table.c.document_id).where(
+        table.c.document_id.notin_(select(documents.c.id)))
+    db.session.execute(delete(table).where(table.c.document_id.in_(orphans)))
+    unused = set(db.session.execute(
+        select(ArchiveFile.sha256).where(ArchiveFile.sha256.notin_(select(table.c.sha256)))
+    ).scalars())
+    paths = archive_store.delete_entries(unused)
+    db.session.commit()
+    archive_store.remove_files(paths)
+    return len(paths) + archive_store.sweep_orphan_files()
+
+def _collect_deleted(session, flush_context):
+    for obj in session.deleted:
+        if isinstance(obj, Document):
+            session.info.setdefault('deleted_pdf_documents', set()).add(obj.id)
+
+def _after_commit(session):
+    document_ids = session.info.pop('deleted_pdf_documents', set())
+    if not document_ids:
+        return
+    # Connexion dédiée : la session vient d'être commitée
+    paths = []
+    with db.engine.begin() as connection:
+        for document_id in document_ids:
+            paths.extend(_evict(connection, document_id))
+    archive_store.remove_files(paths)
+
+def _after_rollback(session):
+    session.info.pop('deleted_pdf_documents', None)
+
+def register_pdf_cache_listeners():
+    """Retire les PDF d'un document supprimé du magasin, une fois la suppression commitée."""
+    if not event.contains(Session, 'after_flush', _collect_deleted):
+        event.listen(Session, 'after_flush', _collect_deleted)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
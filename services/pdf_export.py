@@ -0,0 +1,100 @@
+import os
+import time
+import zipfile
+from flask import current_app, request
+from sqlalchemy.orm import selectinload, joinedload
+from models import Document
+from services.archive_store import content_hash
+from services.pdf_cache import get_cached_pdf, pdf_is_cached, forget_pdfs
+
+# Export ZIP des PDF d'une liste (factures / avoirs du mois pour le comptable).
+# Le ZIP est produit au fil de l'eau : les PDF déjà en cache partent d'abord,
+# les autres sont rendus dans le pool (services/pdf_prerender) et ajoutés dès
+# qu'ils sont prêts. La mémoire reste bornée à un bloc de lecture.
+CHUNK_SIZE = 64 * 1024
+
+class _ZipStream:
+    """Sortie non positionnable de zipfile, vidée par le générateur à chaque bloc."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def export_filename(document):
+    """Nom du PDF dans l'archive (même nom que la pièce jointe des emails)."""
+    return f"{document.type}_{document.numero}.pdf"
+
+def _open_pdf(document):
+    path = get_cached_pdf(document)
+    try:
+        return open(os.path.join(current_app.config['UPLOAD_FOLDER'], path), 'rb')
+    except FileNotFoundError:
+        # Entrée du magasin sans fichier (restauration partielle) : nouveau rendu
+        forget_pdfs([content_hash(path)])
+        return open(os.path.join(current_app.config['UPLOAD_FOLDER'], get_cached_pdf(document)), 'rb')
+
+def _add(archive, stream, document, errors):
+    # Le fichier est ouvert avant l'entrée du ZIP : un échec ne laisse pas
+    # d'entrée tronquée et part dans ERREURS.txt
+    try:
+        src = _open_pdf(document)
+    except Exception as e:
+        errors.append(f"{document.numero} : {e}")
+        return
+    info = zipfile.ZipInfo(export_filename(document), date_time=time.localtime()[:6])
+    # Les PDF sont déjà compressés
+    info.compress_type = zipfile.ZIP_STORED
+    with src, archive.open(info, 'w') as dest:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            dest.write(chunk)
+            data = stream.drain()
+            if data:
+                yield data
+
+def stream_pdf_zip(query):
+    """
+    Générateur des octets d'un ZIP contenant le PDF de chaque document de
+    `query`. Un document dont le rendu échoue est listé dans ERREURS.txt.
+    À envoyer avec stream_with_context().
+    """
+    from services.pdf_prerender import prerender_enabled, render_all
+
+    documents = query.options(
+        selectinload(Document.lignes),
+        joinedload(Document.client),
+        joinedload(Document.supplier),
+        joinedload(Document.source_document)
+    ).order_by(Document.date, Document.numero).all()
+
+    by_id = {document.id: document for document in documents}
+    cached = [document for document in documents if pdf_is_cached(document)]
+    cached_ids = {document.id for document in cached}
+    missing = [document.id for document in documents if document.id not in cached_ids]
+
+    stream = _ZipStream()
+    errors = []
+    with zipfile.ZipFile(stream, 'w') as archive:
+        for document in cached:
+            yield from _add(archive, stream, document, errors)
+
+        ready = render_all(missing, request.host_url) if prerender_enabled() else missing
+        for document_id in ready:
+            yield from _add(archive, stream, by_id[document_id], errors)
+
+        if errors:
+            archive.writestr('ERREURS.txt', '\n'.join(errors))
+    yield stream.drain()
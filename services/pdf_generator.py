@@ -1,41 +1,23 @@
 import os
+import re
+import time
+from contextlib import contextmanager
+from html import unescape
 from flask import render_template, current_app, url_for
 from xhtml2pdf import pisa
-from models import CompanyInfo
-from extensions import db
+from services.settings_registry import get_company_info
+from services.pdf_assets import get_logo, logo_image_reader, split_styles, weasyprint_stylesheet
 from io import BytesIO
 import qrcode
 import base64
-import uuid
+import hashlib
+from functools import lru_cache
 
-def ensure_document_token(document):
-    """
-    Assure que le document a un token sécurisé.
-    Si non, en génère un et le sauvegarde silencieusement.
-    """
-    if not document.secure_token:
-        # Capture timestamp
-        original_updated = document.updated_at 
-        
-        document.secure_token = str(uuid.uuid4())
-        db.session.commit()
-        
-        # Restore timestamp if changed to avoid "updated" status change
-        if document.updated_at != original_updated:
-            document.updated_at = original_updated
-            db.session.commit()
+# Nombre de QR codes (PNG base64) gardés en mémoire par processus
+QR_CACHE_SIZE = 1024
 
-def generate_qr_code_b64(document):
-    """
-    Génère le QR code pour un document et retourne la chaîne base64.
-    """
-    # Ensure token exists
-    ensure_document_token(document)
-    
-    # Generate link
-    verify_url = url_for('public.verify', token=document.secure_token, _external=True)
-    
-    # Make QR
+def _qr_png(verify_url):
+    """Construit le PNG du QR code de l'URL donnée."""
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -48,17 +30,46 @@ def generate_qr_code_b64(document):
     img = qr.make_image(fill_color="black", back_color="white")
     buffered = BytesIO()
     img.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+    return buffered.getvalue()
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def _qr_b64(verify_url, cache_folder):
+    # Cache disque optionnel (QR_CACHE_FOLDER), partagé entre les processus
+    path = None
+    if cache_folder:
+        digest = hashlib.sha256(verify_url.encode('utf-8')).hexdigest()
+        path = os.path.join(cache_folder, f"{digest}.png")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return base64.b64encode(f.read()).decode("utf-8")
+
+    png = _qr_png(verify_url)
+    if path:
+        os.makedirs(cache_folder, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+    return base64.b64encode(png).decode("utf-8")
+
+def generate_qr_code_b64(document):
+    """
+    Retourne le QR code (PNG base64) du lien de vérification du document,
+    mis en cache par lien. None si le document n'a pas de token (lignes
+    anciennes non migrées : lancer migrate_tokens.py) : pas de QR code.
+    """
+    if not document.secure_token:
+        return None
+    verify_url = url_for('public.verify', token=document.secure_token, _external=True)
+    return _qr_b64(verify_url, current_app.config.get('QR_CACHE_FOLDER'))
 
 def _get_common_context(document):
     """
     Helper to get common context for PDF rendering
     """
-    company_info = CompanyInfo.query.first()
-    static_root = os.path.join(current_app.root_path, 'static')
-    logo_abs_path = ""
-    if company_info and company_info.logo_path:
-        logo_abs_path = os.path.join(static_root, company_info.logo_path)
+    company_info = get_company_info()
+    # Logo préparé une fois par processus (services/pdf_assets)
+    logo = get_logo(company_info.logo_path) if company_info else None
     
     # QR Code for all docs
     qr_code_b64 = generate_qr_code_b64(document)
@@ -66,88 +77,257 @@ def _get_common_context(document):
     return {
         'document': document,
         'info': company_info,
-        'logo_abs_path': logo_abs_path,
+        'logo_abs_path': logo.path if logo else "",
+        'logo_data_uri': logo.data_uri if logo else "",
+        'logo': logo,
         'qr_code_b64': qr_code_b64
     }
 
-def generate_pdf_bytes(document):
-    """
-    Génère le PDF pour un document donné et retourne les octets (bytes).
-    Utilisé pour l'envoi par email.
-    """
+@contextmanager
+def _stage(timings, name):
+    """Ajoute la durée du bloc à timings[name] (benchmark_pdf_render.py), sans effet si timings est None."""
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
     try:
-        context = _get_common_context(document)
-        
-        # Render HTML template
-        html_string = render_template('pdf_template.html', **context)
-        
-        # Generate PDF
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+# --- Moteurs de rendu ---
+# Chaque moteur transforme (document, contexte) en octets PDF. Le moteur
+# utilisé est choisi par type de document dans les Paramètres société
+# (CompanyInfo.pdf_backend_<type>), xhtml2pdf par défaut.
+# Étapes mesurées : 'template' (Jinja), 'layout' (mise en page), 'write'
+# (sérialisation du PDF).
+
+class PdfBackend:
+    name = None
+    label = None
+
+    def render(self, document, context, timings=None):
+        raise NotImplementedError
+
+class Xhtml2pdfBackend(PdfBackend):
+    """Template HTML pdf_template.html rendu par xhtml2pdf (moteur historique)."""
+    name = 'xhtml2pdf'
+    label = 'xhtml2pdf (template HTML)'
+
+    def render(self, document, context, timings=None):
+        with _stage(timings, 'template'):
+            html_string = render_template('pdf_template.html', **context)
         pdf_buffer = BytesIO()
-        pisa_status = pisa.CreatePDF(src=html_string, dest=pdf_buffer)
-        
+        # pisa met en page et écrit en une passe : l'écriture est comptée dans 'layout'
+        with _stage(timings, 'layout'):
+            pisa_status = pisa.CreatePDF(src=html_string, dest=pdf_buffer)
         if pisa_status.err:
             raise Exception(f"Erreur PDF (code {pisa_status.err})")
-        
         return pdf_buffer.getvalue()
-    except Exception as e:
-        import traceback
-        print(f"PDF Error:\n{traceback.format_exc()}")
-        raise e
 
-def generate_pdf(document):
+class WeasyPrintBackend(PdfBackend):
+    """Même template HTML rendu par WeasyPrint."""
+    name = 'weasyprint'
+    label = 'WeasyPrint (template HTML)'
+
+    def render(self, document, context, timings=None):
+        # Import tardif : WeasyPrint dépend de bibliothèques système (Pango)
+        from weasyprint import HTML
+        with _stage(timings, 'template'):
+            html_string = render_template('pdf_template.html', **context)
+        # Feuille de style du template analysée une fois par processus
+        html_string, css_text = split_styles(html_string)
+        stylesheet, font_config = weasyprint_stylesheet(css_text)
+        with _stage(timings, 'layout'):
+            rendered = HTML(string=html_string, base_url=current_app.root_path).render(
+                stylesheets=[stylesheet], font_config=font_config)
+        with _stage(timings, 'write'):
+            return rendered.write_pdf()
+
+class ReportLabBackend(PdfBackend):
+    """
+    Mise en page standard dessinée directement sur un canvas ReportLab,
+    sans passer par le template HTML (l'éditeur de template ne s'applique pas).
+    """
+    name = 'reportlab'
+    label = 'ReportLab (mise en page standard)'
+
+    # Catégories dont la quantité et le prix unitaire ne sont pas affichés
+    HIDDEN_PRICE = {'prestation', 'texte_libre', 'main_doeuvre', 'evacuation_dechets'}
+    FIXED_LABELS = {'evacuation_dechets': "Évacuation des déchets", 'main_doeuvre': "Main-d'œuvre"}
+
+    def render(self, document, context, timings=None):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.setTitle(document.numero)
+        with _stage(timings, 'layout'):
+            self._draw(pdf, document, context)
+        with _stage(timings, 'write'):
+            pdf.save()
+        return buffer.getvalue()
+
+    def _draw(self, pdf, document, context):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import mm
+        from reportlab.lib.utils import ImageReader, simpleSplit
+
+        info = context['info']
+        width, height = A4
+        left, right = 15 * mm, width - 15 * mm
+        bottom = 35 * mm
+        columns = (left, left + 100 * mm, left + 125 * mm, right)
+        page = [1]
+
+        def footer():
+            pdf.setFont('Helvetica', 7)
+            text_y = 20 * mm
+            for line in simpleSplit(_plain_text(info.footer_info if info else ''), 'Helvetica', 7, right - left - 25 * mm)[:4]:
+                pdf.drawCentredString(width / 2, text_y, line)
+                text_y -= 9
+            pdf.drawCentredString(width / 2, 10 * mm, f"Page {page[0]}")
+            if context['qr_code_b64']:
+                qr = ImageReader(BytesIO(base64.b64decode(context['qr_code_b64'])))
+                pdf.drawImage(qr, right - 18 * mm, 8 * mm, 18 * mm, 18 * mm)
+
+        def table_header(y):
+            pdf.setFillGray(0.87)
+            pdf.rect(left, y - 4, right - left, 14, stroke=0, fill=1)
+            pdf.setFillGray(0)
+            pdf.setFont('Helvetica-Bold', 9)
+            pdf.drawString(left + 2, y, "Désignation")
+            pdf.drawRightString(columns[1] + 18 * mm, y, "Qté")
+            pdf.drawRightString(columns[2] + 25 * mm, y, "Prix Unitaire HT")
+            pdf.drawRightString(right - 2, y, "Total HT")
+            return y - 16
+
+        def new_page():
+            footer()
+            pdf.showPage()
+            page[0] += 1
+            pdf.setFont('Helvetica-Bold', 10)
+            pdf.drawRightString(right, height - 15 * mm, f"N° {document.numero}")
+            return table_header(height - 25 * mm)
+
+        # En-tête : logo, société, numéro
+        y = height - 15 * mm
+        pdf.setFont('Helvetica-Bold', 10)
+        pdf.drawRightString(right, y, f"N° {document.numero}")
+        if context['logo']:
+            pdf.drawImage(logo_image_reader(context['logo']), left, y - 25 * mm, 40 * mm, 25 * mm,
+                          preserveAspectRatio=True, mask='auto')
+        if info:
+            pdf.setFont('Helvetica-Bold', 13)
+            pdf.drawCentredString(width / 2, y - 5 * mm, info.nom or '')
+            pdf.setFont('Helvetica', 9)
+            for i, line in enumerate([info.adresse or '', f"{info.cp or ''} {info.ville or ''}",
+                                      f"Tél : {info.telephone or ''}", f"Email : {info.email or ''}"]):
+                pdf.drawCentredString(width / 2, y - 11 * mm - i * 11, line)
+
+        # Titre du document et destinataire
+        y -= 45 * mm
+        title = "BON DE COMMANDE" if document.type == 'bon_de_commande' else document.type.upper()
+        pdf.setFont('Helvetica-Bold', 12)
+        pdf.drawString(left, y, f"{title} : N° {document.numero}")
+        party = document.supplier if document.type == 'bon_de_commande' else document.client
+        if party:
+            pdf.setFont('Helvetica-Bold', 11)
+            pdf.drawString(columns[1], y, party.raison_sociale or '')
+            pdf.setFont('Helvetica', 9)
+            pdf.drawString(columns[1], y - 12, party.adresse or '')
+            pdf.drawString(columns[1], y - 23, f"{party.code_postal or ''} {party.ville or ''}")
+            if party.tva_intra:
+                pdf.drawString(columns[1], y - 34, f"TVA Intra: {party.tva_intra}")
+        pdf.setFont('Helvetica', 9)
+        if document.type == 'avoir' and document.source_document:
+            pdf.drawString(left, y - 12, f"(Sur facture N° {document.source_document.numero})")
+        if document.client_reference:
+            pdf.drawString(left, y - 23, f"Référence Client : {document.client_reference}")
+        if document.chantier_reference:
+            pdf.drawString(left, y - 34, f"Référence Chantier : {document.chantier_reference}")
+        if document.date:
+            ville = (info.ville if info else None) or 'Montreuil'
+            pdf.drawString(left, y - 45, f"{ville} le {document.date.strftime('%d/%m/%Y')}")
+
+        # Lignes
+        y = table_header(y - 60)
+        for ligne in document.lignes:
+            label = self.FIXED_LABELS.get(ligne.category) or _plain_text(ligne.designation)
+            if ligne.category == 'prestation':
+                label = f"Prestation : {label}"
+            wrapped = simpleSplit(label, 'Helvetica', 9, columns[1] - left - 4) or ['']
+            if y - 11 * len(wrapped) < bottom:
+                y = new_page()
+            pdf.setFont('Helvetica', 9)
+            for i, line in enumerate(wrapped):
+                pdf.drawString(left + 2, y - i * 11, line)
+            if ligne.category not in self.HIDDEN_PRICE:
+                pdf.drawRightString(columns[1] + 18 * mm, y, f"{round(ligne.quantite or 0, 2):g}")
+                pdf.drawRightString(columns[2] + 25 * mm, y, f"{ligne.prix_unitaire or 0:.2f} €")
+            if ligne.category != 'prestation' and not (ligne.category == 'texte_libre' and not ligne.total_ligne):
+                pdf.drawRightString(right - 2, y, f"{ligne.total_ligne or 0:.2f} €")
+            y -= 11 * len(wrapped)
+            pdf.line(left, y + 7, right, y + 7)
+            y -= 4
+
+        # Totaux et conditions
+        if y - 40 * mm < bottom:
+            y = new_page()
+        y -= 10
+        pdf.setFont('Helvetica', 10)
+        tva_label = ("TVA (Autoliquidation) : 0.00 €" if document.autoliquidation
+                     else f"TVA ({document.tva_rate or 20.0:.1f}%) : {document.tva or 0:.2f} €")
+        pdf.drawRightString(right, y, f"{tva_label}  |  Total HT : {document.montant_ht or 0:.2f} €")
+        pdf.setFont('Helvetica-Bold', 12)
+        net = "Net à Payer (HT)" if document.autoliquidation else "Net à Payer"
+        pdf.drawRightString(right, y - 16, f"{net} : {document.montant_ttc or 0:.2f} €")
+        y -= 32
+        pdf.setFont('Helvetica-Oblique', 8)
+        if document.type != 'bon_de_commande' and document.autoliquidation:
+            pdf.drawRightString(right, y, "Auto liquidation de la TVA suivant CGI, Ann. II, art.242 Nonies A-I-13")
+            y -= 14
+        if info and document.type != 'bon_de_commande':
+            pdf.setFont('Helvetica', 8)
+            conditions = [part for part in (
+                f"Conditions de règlement : {_plain_text(info.conditions_reglement)}" if info.conditions_reglement else '',
+                f"IBAN : {info.iban}" if info.iban else '') if part]
+            for line in simpleSplit(' - '.join(conditions), 'Helvetica', 8, right - left):
+                pdf.drawString(left, y, line)
+                y -= 10
+
+        footer()
+
+PDF_BACKENDS = {backend.name: backend for backend in (Xhtml2pdfBackend(), WeasyPrintBackend(), ReportLabBackend())}
+DEFAULT_BACKEND = 'xhtml2pdf'
+
+def _plain_text(html_content):
+    """Texte brut d'une désignation saisie dans l'éditeur riche."""
+    if not html_content:
+        return ''
+    text = re.sub(r'<\s*(br|/p|/div|/li)\s*/?>', ' ', html_content, flags=re.I)
+    return re.sub(r'\s+', ' ', unescape(re.sub(r'<[^>]+>', '', text))).strip()
+
+def backend_for(document):
+    """Moteur configuré pour le type du document (Paramètres société)."""
+    info = get_company_info()
+    name = getattr(info, f'pdf_backend_{document.type}', None) if info else None
+    return PDF_BACKENDS.get(name or DEFAULT_BACKEND, PDF_BACKENDS[DEFAULT_BACKEND])
+
+def generate_pdf_bytes(document, backend=None, timings=None):
     """
-    Génère le PDF pour un document donné et l'enregistre.
-    Retourne le nom du fichier.
-    Utilisé pour l'affichage/téléchargement.
+    Génère le PDF pour un document donné et retourne les octets (bytes).
+    Rendu brut, sans cache : passer par services.pdf_cache pour servir un PDF.
+    `backend` (nom) force un moteur, sinon celui configuré pour le type.
+    `timings` (dict) reçoit la durée de chaque étape du rendu.
     """
     try:
-        context = _get_common_context(document)
-        
-        # Rendu du template HTML
-        html_string = render_template('pdf_template.html', **context)
-        
-        # Filename
-        filename = f"{document.numero}.pdf"
-        save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        
-        # Generate and save PDF
-        with open(save_path, "wb") as result_file:
-            pisa_status = pisa.CreatePDF(src=html_string, dest=result_file)
-            
-        if pisa_status.err:
-            raise Exception(f"Erreur PDF (code {pisa_status.err})")
-        
-        # Update database (Silent Update)
-        original_updated_final = document.updated_at
-        document.pdf_path = filename
-        db.session.commit()
-        
-        # Restore timestamp to prevent "Mise à jour" badge
-        if document.updated_at != original_updated_final:
-            document.updated_at = original_updated_final
-            db.session.commit()
-        
-        return filename
-        
+        with _stage(timings, 'context'):
+            context = _get_common_context(document)
+        engine = PDF_BACKENDS[backend] if backend else backend_for(document)
+        return engine.render(document, context, timings=timings)
     except Exception as e:
-        print(f"PDF Error: {e}")
         import traceback
-        print(traceback.format_exc())
+        print(f"PDF Error:\n{traceback.format_exc()}")
         raise e
-
-def delete_old_pdf(document):
-    """
-    Supprime l'ancien PDF d'un document si il existe.
-    À appeler avant de modifier un document.
-    """
-    if document.pdf_path:
-        old_pdf_path = os.path.join(current_app.config['UPLOAD_FOLDER'], document.pdf_path)
-        if os.path.exists(old_pdf_path):
-            try:
-                os.remove(old_pdf_path)
-                print(f"✅ Old PDF deleted: {document.pdf_path}")
-            except Exception as e:
-                print(f"⚠️ Could not delete old PDF: {e}")
-        
-        # Réinitialiser le chemin PDF dans la base
-        document.pdf_path = None
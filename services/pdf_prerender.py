@@ -0,0 +1,252 @@
+import atexit
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from itertools import chain
+from flask import current_app, request, has_request_context
+from sqlalchemy import event, select, insert, update, delete
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Document, LigneDocument, PdfRenderJob
+
+logger = logging.getLogger(__name__)
+
+# Pré-rendu des PDF dans un pool de processus. Chaque commit qui crée ou
+# modifie un document (formulaires, conversions, assistant) met son rendu
+# en file ; view_pdf sert alors le fichier du cache (services/pdf_cache) ou
+# attend le job en cours au lieu de lancer un second rendu.
+# La file est bornée (PDF_PRERENDER_QUEUE_SIZE par processus web) : quand
+# elle est pleine le document n'est pas mis en file et sera rendu à la
+# demande, comme avant.
+
+# Au-delà, un job pending/running est considéré abandonné (worker tué)
+STALE_AFTER = timedelta(minutes=5)
+
+_lock = threading.Lock()
+_state = {'enabled': False, 'pool': None, 'slots': None, 'config_class': None}
+_in_flight = {}     # document_id -> Future (processus courant)
+_rerun = set()      # documents modifiés pendant leur rendu
+_worker = {'is_worker': False, 'app': None}
+
+# --- Processus de rendu ---
+
+def _init_worker(config_class):
+    # Avant create_app() : un worker ne doit pas ouvrir son propre pool
+    _worker['is_worker'] = True
+    from app import create_app
+    from services.pdf_assets import warm_pdf_assets
+    # Même configuration que l'application web (base, UPLOAD_FOLDER), sans
+    # planificateur ni sauvegardes : le processus web s'en charge
+    _worker['app'] = create_app(config_class, background_jobs=False)
+    with _worker['app'].app_context():
+        try:
+            warm_pdf_assets()
+        except Exception:
+            logger.exception("PDF assets could not be preloaded")
+
+def _set_status(document_id, status, **values):
+    db.session.execute(
+        update(PdfRenderJob).where(PdfRenderJob.document_id == document_id)
+        .values(status=status, **values)
+    )
+    db.session.commit()
+
+def _render(document_id):
+    from services.pdf_cache import get_cached_pdf
+
+    document = db.session.get(Document, document_id)
+    if document is not None:
+        get_cached_pdf(document)
+
+def _render_job(document_id, base_url):
+    app = _worker['app']
+    # Contexte de requête : url_for(_external=True) du QR code
+    with app.test_request_context(base_url=base_url):
+        try:
+            _set_status(document_id, 'running', started_at=datetime.utcnow())
+            _render(document_id)
+            _set_status(document_id, 'done', finished_at=datetime.utcnow(), error=None)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("PDF pre-render failed for document %s", document_id)
+            _set_status(document_id, 'failed', finished_at=datetime.utcnow(), error=str(e))
+        finally:
+            db.session.remove()
+
+def _render_document(document_id, base_url):
+    # Rendu sans job (export) : le résultat est lu depuis le cache par l'appelant
+    with _worker['app'].test_request_context(base_url=base_url):
+        try:
+            _render(document_id)
+        finally:
+            db.session.remove()
+
+# --- Processus web ---
+
+def prerender_enabled():
+    """True si le pool de rendu est disponible dans ce processus."""
+    return _state['enabled']
+
+def _get_pool(app):
+    with _lock:
+        if _state['pool'] is None:
+            _state['pool'] = ProcessPoolExecutor(
+                max_workers=app.config['PDF_PRERENDER_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(_state['config_class'],)
+            )
+            _state['slots'] = threading.BoundedSemaphore(app.config['PDF_PRERENDER_QUEUE_SIZE'])
+            atexit.register(_state['pool'].shutdown, wait=False, cancel_futures=True)
+        return _state['pool'], _state['slots']
+
+def _write_pending(document_id):
+    # Connexion dédiée : appelé après le commit de la session
+    table = PdfRenderJob.__table__
+    with db.engine.begin() as connection:
+        connection.execute(delete(table).where(table.c.document_id == document_id))
+        connection.execute(insert(table).values(
+            document_id=document_id, status='pending', enqueued_at=datetime.utcnow()))
+
+def _submit(app, document_id, base_url):
+    pool, slots = _get_pool(app)
+    if not slots.acquire(blocking=False):
+        logger.info("PDF pre-render queue full, document %s will render on demand", document_id)
+        return
+    try:
+        _write_pending(document_id)
+        future = pool.submit(_render_job, document_id, base_url)
+    except Exception:
+        slots.release()
+        logger.exception("Could not queue PDF pre-render of document %s", document_id)
+        return
+    with _lock:
+        _in_flight[document_id] = future
+    future.add_done_callback(lambda f: _on_done(app, document_id, base_url))
+
+def _on_done(app, document_id, base_url):
+    _state['slots'].release()
+    with _lock:
+        _in_flight.pop(document_id, None)
+        again = document_id in _rerun
+        _rerun.discard(document_id)
+    if again:
+        with app.app_context():
+            _submit(app, document_id, base_url)
+
+def enqueue(document_ids, base_url=None):
+    """Met en file le pré-rendu des documents donnés (sans doublon par document)."""
+    app = current_app._get_current_object()
+    for document_id in sorted(document_ids):
+        with _lock:
+            if document_id in _in_flight:
+                # Le rendu en cours peut porter sur l'ancienne version
+                _rerun.add(document_id)
+                continue
+        _submit(app, document_id, base_url)
+
+def render_all(document_ids, base_url=None):
+    """
+    Rend en parallèle dans le pool les PDF des documents donnés et génère
+    leurs id dans l'ordre de fin de rendu (réussi ou non : l'appelant lit
+    le cache et retombe sur un rendu local si besoin). Au plus deux rendus
+    par worker sont soumis à la fois ; un pré-rendu déjà en cours est réutilisé.
+    """
+    app = current_app._get_current_object()
+    pool, _ = _get_pool(app)
+    limit = max(1, app.config['PDF_PRERENDER_WORKERS']) * 2
+    remaining = iter(document_ids)
+    pending = {}
+
+    def fill():
+        while len(pending) < limit:
+            document_id = next(remaining, None)
+            if document_id is None:
+                return
+            with _lock:
+                future = _in_flight.get(document_id)
+            if future is None:
+                future = pool.submit(_render_document, document_id, base_url)
+            pending[future] = document_id
+
+    fill()
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future)
+        fill()
+
+def wait_for_render(document_id):
+    """
+    Attend (au plus PDF_RENDER_WAIT secondes) la fin du pré-rendu en cours
+    du document, lancé par ce processus ou par un autre processus web.
+    Ne fait rien si aucun job n'est en cours.
+    """
+    timeout = current_app.config.get('PDF_RENDER_WAIT', 10)
+    future = _in_flight.get(document_id)
+    if future is not None:
+        try:
+            future.result(timeout=timeout)
+        except Exception:
+            pass
+        return
+
+    table = PdfRenderJob.__table__
+    stmt = select(table.c.status, table.c.enqueued_at).where(table.c.document_id == document_id)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        # Connexion dédiée : la session garderait le même instantané
+        with db.engine.connect() as connection:
+            row = connection.execute(stmt).first()
+        if (row is None or row.status not in ('pending', 'running')
+                or row.enqueued_at < datetime.utcnow() - STALE_AFTER):
+            return
+        time.sleep(0.1)
+
+def _collect(session, flush_context):
+    if not _state['enabled']:
+        return
+    ids = session.info.setdefault('prerender_ids', set())
+    for obj in chain(session.new, session.dirty):
+        if isinstance(obj, Document):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            ids.add(obj.id)
+        elif isinstance(obj, LigneDocument):
+            ids.add(obj.document_id)
+    for obj in session.deleted:
+        if isinstance(obj, Document):
+            session.info.setdefault('prerender_deleted', set()).add(obj.id)
+
+def _after_commit(session):
+    ids = session.info.pop('prerender_ids', set())
+    ids -= session.info.pop('prerender_deleted', set())
+    ids.discard(None)
+    # Uniquement pour les requêtes web (pas les scripts de maintenance)
+    if ids and has_request_context():
+        try:
+            enqueue(ids, request.host_url)
+        except Exception:
+            logger.exception("PDF pre-render could not be queued")
+
+def _after_rollback(session):
+    session.info.pop('prerender_ids', None)
+    session.info.pop('prerender_deleted', None)
+
+def init_pdf_prerender(app, config_class):
+    """
+    Active le pré-rendu si PDF_PRERENDER_WORKERS > 0 (jamais dans un worker
+    de rendu). Les workers construisent leur application avec `config_class`,
+    qui doit être importable (défini au niveau d'un module).
+    """
+    if _worker['is_worker'] or app.config.get('PDF_PRERENDER_WORKERS', 0) <= 0:
+        return
+    _state['enabled'] = True
+    _state['config_class'] = config_class
+    if not event.contains(Session, 'after_flush', _collect):
+        event.listen(Session, 'after_flush', _collect)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
@@ -0,0 +1,172 @@
+from datetime import datetime
+from sqlalchemy import event, func, extract, case, select, delete, insert, and_, not_, inspect
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Document, LigneDocument, Expense, MonthlyRollup
+
+# Clé de session.info où sont accumulés les mois à recalculer pendant un flush
+_PENDING_KEY = 'rollup_pending'
+
+def _month_of(value):
+    if value is None:
+        return None
+    return (value.year, value.month)
+
+def _month_bounds(year, month):
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+def _current_and_old(obj, attr):
+    """Valeur actuelle + anciennes valeurs (historique) d'un attribut."""
+    values = [getattr(obj, attr)]
+    values.extend(inspect(obj).attrs[attr].history.deleted)
+    return [v for v in values if v is not None]
+
+def _document_rows(start=None, end=None):
+    """Agrégats des documents par (année, mois, type, payé, autoliquidation)."""
+    avoir_sources = select(Document.source_document_id).where(
+        Document.type == 'avoir',
+        Document.source_document_id.isnot(None)
+    )
+    paid = func.coalesce(Document.paid, False)
+    autoliq = func.coalesce(Document.autoliquidation, False)
+    stmt = select(
+        extract('year', Document.date),
+        extract('month', Document.date),
+        Document.type,
+        paid,
+        autoliq,
+        func.coalesce(func.sum(Document.montant_ht), 0.0),
+        func.coalesce(func.sum(Document.tva), 0.0),
+        func.coalesce(func.sum(Document.montant_ttc), 0.0),
+        func.count(Document.id)
+    ).where(
+        Document.date.isnot(None),
+        not_(and_(Document.type == 'facture', Document.id.in_(avoir_sources)))
+    )
+    if start is not None:
+        stmt = stmt.where(Document.date >= start, Document.date < end)
+    return stmt.group_by(
+        extract('year', Document.date), extract('month', Document.date), Document.type, paid, autoliq
+    )
+
+def _expense_rows(start=None, end=None):
+    """Agrégats des notes de frais par (année, mois)."""
+    stmt = select(
+        extract('year', Expense.date),
+        extract('month', Expense.date),
+        func.coalesce(func.sum(Expense.amount_ht), 0.0),
+        func.coalesce(func.sum(Expense.tva), 0.0),
+        func.coalesce(func.sum(Expense.amount_ttc), 0.0),
+        func.count(Expense.id)
+    ).where(Expense.date.isnot(None))
+    if start is not None:
+        stmt = stmt.where(Expense.date >= start, Expense.date < end)
+    return stmt.group_by(extract('year', Expense.date), extract('month', Expense.date))
+
+def _write_rows(connection, start=None, end=None):
+    values = []
+    for year, month, doc_type, paid, autoliq, ht, tva, ttc, count in connection.execute(_document_rows(start, end)):
+        values.append({
+            'year': int(year), 'month': int(month), 'doc_type': doc_type,
+            'paid': bool(paid), 'autoliquidation': bool(autoliq),
+            'montant_ht': ht, 'tva': tva, 'montant_ttc': ttc, 'count': count
+        })
+    for year, month, ht, tva, ttc, count in connection.execute(_expense_rows(start, end)):
+        values.append({
+            'year': int(year), 'month': int(month), 'doc_type': 'expense',
+            'paid': False, 'autoliquidation': False,
+            'montant_ht': ht, 'tva': tva, 'montant_ttc': ttc, 'count': count
+        })
+    if values:
+        connection.execute(insert(MonthlyRollup.__table__), values)
+    return len(values)
+
+def refresh_months(connection, months):
+    """Recalcule les lignes de rollup des mois (année, mois) donnés."""
+    table = MonthlyRollup.__table__
+    for year, month in sorted(months):
+        start, end = _month_bounds(year, month)
+        connection.execute(delete(table).where(table.c.year == year, table.c.month == month))
+        _write_rows(connection, start, end)
+
+def rebuild_rollup():
+    """Recalcule entièrement la table de rollup. Retourne le nombre de lignes écrites."""
+    connection = db.session.connection()
+    connection.execute(delete(MonthlyRollup.__table__))
+    written = _write_rows(connection)
+    db.session.commit()
+    return written
+
+def _collect_changes(session, flush_context, instances):
+    months = set()
+    doc_ids = set()
+
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Document):
+                months.update(_month_of(d) for d in _current_and_old(obj, 'date'))
+                # Un avoir lié retire (ou rend) sa facture source du chiffre d'affaires
+                if obj.type == 'avoir':
+                    doc_ids.update(_current_and_old(obj, 'source_document_id'))
+            elif isinstance(obj, Expense):
+                months.update(_month_of(d) for d in _current_and_old(obj, 'date'))
+            elif isinstance(obj, LigneDocument):
+                doc_ids.update(_current_and_old(obj, 'document_id'))
+                if obj.document is not None:
+                    months.add(_month_of(obj.document.date))
+
+    months.discard(None)
+    session.info[_PENDING_KEY] = (months, doc_ids)
+
+def _apply_changes(session, flush_context):
+    months, doc_ids = session.info.pop(_PENDING_KEY, (set(), set()))
+    if not months and not doc_ids:
+        return
+
+    connection = session.connection()
+    if doc_ids:
+        rows = connection.execute(select(Document.date).where(Document.id.in_(doc_ids)))
+        months.update(_month_of(d) for (d,) in rows)
+        months.discard(None)
+    refresh_months(connection, months)
+
+def register_rollup_listeners():
+    """
+    Branche la maintenance incrémentale du rollup sur les flushs de session :
+    chaque flush touchant un Document, une LigneDocument ou une Expense
+    recalcule uniquement les mois concernés, dans la même transaction.
+    """
+    if not event.contains(Session, 'before_flush', _collect_changes):
+        event.listen(Session, 'before_flush', _collect_changes)
+        event.listen(Session, 'after_flush', _apply_changes)
+
+def read_rollup(year=None, since=None, by_month=False):
+    """
+    Lit les agrégats depuis le rollup.
+    Retourne des tuples (doc_type, [month,] ht, tva, ttc, ttc_regle, ht_autoliq, count).
+    - year : limite à une année
+    - since : datetime, limite aux mois à partir de celui-ci
+    """
+    group_cols = [MonthlyRollup.doc_type]
+    if by_month:
+        group_cols.append(MonthlyRollup.month)
+
+    query = db.session.query(
+        *group_cols,
+        func.sum(MonthlyRollup.montant_ht),
+        func.sum(MonthlyRollup.tva),
+        func.sum(MonthlyRollup.montant_ttc),
+        func.sum(case((MonthlyRollup.paid == True, MonthlyRollup.montant_ttc), else_=0.0)),
+        func.sum(case((MonthlyRollup.autoliquidation == True, MonthlyRollup.montant_ht), else_=0.0)),
+        func.sum(MonthlyRollup.count)
+    )
+    if year is not None:
+        query = query.filter(MonthlyRollup.year == year)
+    if since is not None:
+        query = query.filter(
+            (MonthlyRollup.year > since.year) |
+            ((MonthlyRollup.year == since.year) & (MonthlyRollup.month >= since.month))
+        )
+    return query.group_by(*group_cols).all()
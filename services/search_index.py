@@ -0,0 +1,182 @@
+import re
+from sqlalchemy import event, text, bindparam, inspect, select, func, literal_column, table, column
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Document, LigneDocument, Client, Supplier, ClientContact
+
+# Index plein texte SQLite FTS5 (rowid = id du document / du client).
+# Les colonnes sont dénormalisées : nom du tiers, numéro du document source,
+# désignations des lignes, date au format affiché et ISO.
+DOCUMENT_FTS = 'document_fts'
+CLIENT_FTS = 'client_fts'
+
+_TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+CREATE_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {DOCUMENT_FTS} USING fts5(
+        numero, party, client_reference, chantier_reference, source_numero,
+        designations, date_text, {_TOKENIZE})""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {CLIENT_FTS} USING fts5(
+        raison_sociale, ville, email, contacts, date_text, {_TOKENIZE})""",
+]
+
+# Poids bm25 par colonne, dans l'ordre de déclaration
+DOCUMENT_WEIGHTS = (10.0, 5.0, 4.0, 4.0, 3.0, 1.0, 1.0)
+CLIENT_WEIGHTS = (10.0, 2.0, 2.0, 3.0, 1.0)
+
+_DOCUMENT_SELECT = """
+    SELECT d.id, d.numero,
+           COALESCE(c.raison_sociale, s.raison_sociale, ''),
+           COALESCE(d.client_reference, ''),
+           COALESCE(d.chantier_reference, ''),
+           COALESCE(src.numero, ''),
+           COALESCE((SELECT group_concat(l.designation, ' ') FROM ligne_document l
+                     WHERE l.document_id = d.id), ''),
+           COALESCE(strftime('%d/%m/%Y', d.date) || ' ' || date(d.date), '')
+    FROM document d
+    LEFT JOIN client c ON c.id = d.client_id
+    LEFT JOIN supplier s ON s.id = d.supplier_id
+    LEFT JOIN document src ON src.id = d.source_document_id
+"""
+
+_CLIENT_SELECT = """
+    SELECT c.id, c.raison_sociale, COALESCE(c.ville, ''), COALESCE(c.email, ''),
+           COALESCE((SELECT group_concat(cc.nom, ' ') FROM client_contact cc
+                     WHERE cc.client_id = c.id), ''),
+           COALESCE(strftime('%d/%m/%Y', c.date_creation) || ' ' || date(c.date_creation), '')
+    FROM client c
+"""
+
+_DOCUMENT_INSERT = f"""INSERT INTO {DOCUMENT_FTS}(rowid, numero, party, client_reference,
+    chantier_reference, source_numero, designations, date_text)"""
+_CLIENT_INSERT = f"INSERT INTO {CLIENT_FTS}(rowid, raison_sociale, ville, email, contacts, date_text)"
+
+# Disponibilité de l'index par moteur (SQLite uniquement, tables créées)
+_available = {}
+
+def search_available(bind=None):
+    """True si l'index FTS5 existe sur la base courante."""
+    bind = bind or db.engine
+    engine = getattr(bind, 'engine', bind)
+    key = str(engine.url)
+    if key not in _available:
+        _available[key] = (
+            engine.dialect.name == 'sqlite'
+            and DOCUMENT_FTS in inspect(engine).get_table_names()
+        )
+    return _available[key]
+
+def create_search_tables():
+    """Crée les tables FTS5 si besoin (SQLite uniquement)."""
+    with db.engine.begin() as connection:
+        for statement in CREATE_STATEMENTS:
+            connection.execute(text(statement))
+    _available.clear()
+
+def rebuild_search_index():
+    """Reconstruit entièrement les deux index. Retourne (documents, clients)."""
+    connection = db.session.connection()
+    connection.execute(text(f"DELETE FROM {DOCUMENT_FTS}"))
+    connection.execute(text(f"DELETE FROM {CLIENT_FTS}"))
+    connection.execute(text(_DOCUMENT_INSERT + _DOCUMENT_SELECT))
+    connection.execute(text(_CLIENT_INSERT + _CLIENT_SELECT))
+    db.session.commit()
+    documents = db.session.execute(text(f"SELECT count(*) FROM {DOCUMENT_FTS}")).scalar()
+    clients = db.session.execute(text(f"SELECT count(*) FROM {CLIENT_FTS}")).scalar()
+    return documents, clients
+
+def build_match_query(q):
+    """
+    Convertit la saisie utilisateur en requête FTS5 : chaque mot devient un
+    préfixe ("dup"* trouve Dupont) et les mots sont combinés en ET. Un terme
+    composé (F-2025-00, 12/03/2025) devient une phrase dont le dernier
+    élément est un préfixe. Retourne None si la saisie ne contient aucun mot.
+    """
+    terms = []
+    for chunk in (q or '').split():
+        tokens = re.findall(r'\w+', chunk)
+        if tokens:
+            terms.append('"%s"*' % ' '.join(tokens))
+    return ' '.join(terms) or None
+
+def _ranked(name, weights, q):
+    match = build_match_query(q)
+    if match is None or not search_available():
+        return None
+    fts = table(name, column('rowid'))
+    score = func.bm25(literal_column(name), *weights)
+    return select(fts.c.rowid.label('id'), score.label('score')).where(
+        literal_column(name).op('MATCH')(match)
+    ).subquery()
+
+def document_search(q):
+    """
+    Sous-requête (id, score) des documents correspondant à `q`, score bm25
+    (plus petit = plus pertinent). None si l'index n'est pas disponible :
+    l'appelant retombe alors sur la recherche ilike.
+    """
+    return _ranked(DOCUMENT_FTS, DOCUMENT_WEIGHTS, q)
+
+def client_search(q):
+    """Même chose que document_search() pour les clients."""
+    return _ranked(CLIENT_FTS, CLIENT_WEIGHTS, q)
+
+def _ids(obj, attr):
+    """Valeur actuelle + ancienne valeur d'une clé étrangère."""
+    values = [getattr(obj, attr)]
+    values.extend(inspect(obj).attrs[attr].history.deleted)
+    return {v for v in values if v is not None}
+
+def _name_changed(obj):
+    return inspect(obj).attrs.raison_sociale.history.has_changes()
+
+def _sync_index(session, flush_context):
+    doc_ids, client_ids, supplier_ids, renamed_client_ids = set(), set(), set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Document):
+            if obj.id is not None:
+                doc_ids.add(obj.id)
+        elif isinstance(obj, LigneDocument):
+            doc_ids.update(_ids(obj, 'document_id'))
+        elif isinstance(obj, Client):
+            client_ids.add(obj.id)
+            if obj in session.dirty and _name_changed(obj):
+                renamed_client_ids.add(obj.id)
+        elif isinstance(obj, Supplier):
+            if obj in session.dirty and _name_changed(obj):
+                supplier_ids.add(obj.id)
+        elif isinstance(obj, ClientContact):
+            client_ids.update(_ids(obj, 'client_id'))
+
+    client_ids.discard(None)
+    if not (doc_ids or client_ids or supplier_ids):
+        return
+    connection = session.connection()
+    if not search_available(connection):
+        return
+
+    if doc_ids or renamed_client_ids or supplier_ids:
+        # Documents dont le libellé dépend des objets modifiés : tiers renommé,
+        # document source renuméroté
+        related = select(Document.id).where(
+            Document.client_id.in_(renamed_client_ids) |
+            Document.supplier_id.in_(supplier_ids) |
+            Document.source_document_id.in_(doc_ids)
+        )
+        doc_ids.update(connection.execute(related).scalars())
+        ids = bindparam('ids', list(doc_ids), expanding=True)
+        connection.execute(text(f"DELETE FROM {DOCUMENT_FTS} WHERE rowid IN :ids").bindparams(ids))
+        connection.execute(text(_DOCUMENT_INSERT + _DOCUMENT_SELECT + " WHERE d.id IN :ids").bindparams(ids))
+
+    if client_ids:
+        ids = bindparam('ids', list(client_ids), expanding=True)
+        connection.execute(text(f"DELETE FROM {CLIENT_FTS} WHERE rowid IN :ids").bindparams(ids))
+        connection.execute(text(_CLIENT_INSERT + _CLIENT_SELECT + " WHERE c.id IN :ids").bindparams(ids))
+
+def register_search_listeners():
+    """
+    Maintient l'index FTS5 à chaque flush : les lignes des documents et
+    clients touchés sont réécrites dans la même transaction.
+    """
+    if not event.contains(Session, 'after_flush', _sync_index):
+        event.listen(Session, 'after_flush', _sync_index)
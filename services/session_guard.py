@@ -0,0 +1,57 @@
+import uuid
+from datetime import datetime
+from flask import session, request, jsonify, redirect, url_for, flash
+from flask_login import current_user, logout_user
+
+# Validation des sessions par "epoch" : chaque utilisateur porte un compteur
+# session_epoch, incrémenté à chaque connexion (qui remplace l'autre session)
+# et à chaque éjection. La session Flask mémorise l'epoch de sa connexion ;
+# elle reste valide tant que les deux valeurs sont égales. Le contrôle ne
+# coûte qu'une comparaison d'entiers sur l'utilisateur déjà chargé par
+# Flask-Login.
+
+def start_session(user):
+    """
+    Ouvre une session pour `user` : nouvel identifiant, nouvel epoch.
+    Les sessions ouvertes ailleurs deviennent invalides.
+    Le commit reste à la charge de l'appelant.
+    """
+    user.current_session_id = str(uuid.uuid4())
+    user.session_epoch = (user.session_epoch or 0) + 1
+    session['sid'] = user.current_session_id
+    session['epoch'] = user.session_epoch
+    session['login_at'] = datetime.utcnow()
+
+def end_sessions(user):
+    """Invalide toutes les sessions de `user` (éjection par un administrateur)."""
+    user.force_logout_at = datetime.utcnow()
+    user.session_epoch = (user.session_epoch or 0) + 1
+    user.current_session_id = None
+
+def validate_session():
+    """
+    Vérifie la session de l'utilisateur connecté.
+    Retourne None si elle est valide, sinon la réponse de déconnexion.
+    """
+    current_epoch = current_user.session_epoch or 0
+    epoch = session.get('epoch')
+    if epoch is None and session.get('sid') and session['sid'] == current_user.current_session_id:
+        # Session ouverte avant l'introduction des epochs : adoptée une fois
+        epoch = session['epoch'] = current_epoch
+    if epoch == current_epoch:
+        return None
+
+    # Session remplacée par une nouvelle connexion, ou éjectée (sid vidé)
+    replaced = current_user.current_session_id is not None
+    logout_user()
+    session.clear()
+
+    # Handle API requests with JSON 401
+    if request.path.startswith('/api/') or request.is_json:
+        return jsonify({'error': 'ejected', 'message': 'Session terminated'}), 401
+
+    if replaced:
+        flash("Votre session a été fermée car vous vous êtes connecté sur un autre appareil.", "warning")
+    else:
+        flash("Votre session a été terminée par un administrateur.", "danger")
+    return redirect(url_for('auth.login'))
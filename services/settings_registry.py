@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from extensions import db
+from models import CompanyInfo, AISettings
+from services.versioning import get_version, bump_version
+
+# Registre des réglages singletons (CompanyInfo, AISettings).
+# Chaque processus garde un instantané immuable (namedtuple) de chaque ligne.
+# Le compteur partagé 'settings' (table data_version) est relu au plus une
+# fois toutes les SETTINGS_CHECK_INTERVAL secondes ; il est incrémenté par
+# commit_settings() quand la page Paramètres enregistre une modification.
+SETTINGS_VERSION = 'settings'
+
+_lock = threading.Lock()
+_state = {'version': None, 'checked': None, 'values': {}}
+_snapshot_types = {}
+
+_LOADERS = {
+    'company': lambda: CompanyInfo.query.first(),
+    'ai': lambda: AISettings.get_settings(),
+}
+
+def _snapshot(obj):
+    """Copie immuable des colonnes d'une ligne (None si pas de ligne)."""
+    if obj is None:
+        return None
+    model = type(obj)
+    if model not in _snapshot_types:
+        fields = [column.key for column in model.__table__.columns]
+        _snapshot_types[model] = namedtuple(f'{model.__name__}Snapshot', fields)
+    snapshot_type = _snapshot_types[model]
+    return snapshot_type(**{field: getattr(obj, field) for field in snapshot_type._fields})
+
+def _get(name):
+    now = time.monotonic()
+    interval = current_app.config.get('SETTINGS_CHECK_INTERVAL', 5)
+    with _lock:
+        checked = _state['checked']
+        if checked is not None and now - checked < interval and name in _state['values']:
+            return _state['values'][name]
+
+    version = get_version(SETTINGS_VERSION)
+    with _lock:
+        if version != _state['version']:
+            _state['values'] = {}
+            _state['version'] = version
+        _state['checked'] = now
+        if name in _state['values']:
+            return _state['values'][name]
+
+    value = _snapshot(_LOADERS[name]())
+    with _lock:
+        if _state['version'] == version:
+            _state['values'][name] = value
+    return value
+
+def get_company_info():
+    """Instantané de CompanyInfo (lecture seule), ou None s'il n'est pas encore saisi."""
+    return _get('company')
+
+def get_ai_settings():
+    """Instantané de AISettings (lecture seule)."""
+    return _get('ai')
+
+def invalidate_settings():
+    """Vide le registre local ; le prochain accès relit le compteur."""
+    with _lock:
+        _state['values'] = {}
+        _state['checked'] = None
+
+def commit_settings():
+    """
+    Valide une modification des réglages : incrémente le compteur partagé
+    dans la même transaction, commit, puis vide le registre local. Les
+    autres processus rechargent au plus tard SETTINGS_CHECK_INTERVAL
+    secondes après.
+    """
+    bump_version(SETTINGS_VERSION)
+    db.session.commit()
+    invalidate_settings()
@@ -0,0 +1,89 @@
+import re
+import time
+from collections import Counter
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Instrumentation SQL par requête HTTP (opt-in : SQL_INSTRUMENTATION).
+# Par requête SQL : un perf_counter et un incrément de compteur ; la
+# normalisation et les logs ne sont faits que pour les requêtes signalées.
+
+_WHITESPACE = re.compile(r'\s+')
+_PARAM_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+
+def normalize_sql(statement):
+    """SQL sur une ligne, listes IN (?, ?, ...) repliées."""
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    return _PARAM_LIST.sub('(?, ...)', statement)
+
+def _route():
+    return f"{request.method} {request.endpoint or request.path}"
+
+def _stats():
+    if has_request_context():
+        return g.get('sql_stats')
+    return None
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _stats() is not None:
+        conn.info.setdefault('sql_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _stats()
+    starts = conn.info.get('sql_query_start')
+    if stats is None or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats['count'] += 1
+    stats['time'] += elapsed
+    stats['statements'][statement] += 1
+
+    if elapsed * 1000 >= stats['slow_ms']:
+        current_app.logger.warning(
+            f"Slow SQL ({elapsed * 1000:.1f} ms) on {_route()}: {normalize_sql(statement)}"
+        )
+
+def _start_request():
+    g.sql_stats = {
+        'count': 0,
+        'time': 0.0,
+        'statements': Counter(),
+        'started': time.perf_counter(),
+        'slow_ms': current_app.config.get('SQL_SLOW_QUERY_MS', 200),
+    }
+
+def _finish_request(response):
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+
+    total_ms = (time.perf_counter() - stats['started']) * 1000
+    response.headers.add(
+        'Server-Timing',
+        f'db;dur={stats["time"] * 1000:.1f};desc="{stats["count"]} queries", app;dur={total_ms:.1f}'
+    )
+
+    # Même requête SQL répétée dans une seule requête HTTP : signature d'un N+1
+    threshold = current_app.config.get('SQL_REPEAT_THRESHOLD', 5)
+    for statement, count in stats['statements'].items():
+        if count >= threshold:
+            current_app.logger.warning(
+                f"Repeated SQL x{count} on {_route()} (possible N+1): {normalize_sql(statement)}"
+            )
+    return response
+
+def init_sql_instrumentation(app):
+    """
+    Active le comptage des requêtes SQL si SQL_INSTRUMENTATION est vrai :
+    en-tête Server-Timing (nombre et durée SQL, durée totale), log des
+    requêtes plus lentes que SQL_SLOW_QUERY_MS et des requêtes identiques
+    répétées au moins SQL_REPEAT_THRESHOLD fois.
+    """
+    if not app.config.get('SQL_INSTRUMENTATION'):
+        return
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,79 @@
+import threading
+import time
+from itertools import chain
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import Document, LigneDocument, Expense
+from services.versioning import get_version, bump_version
+
+STATS_VERSION = 'stats'
+_MAX_ENTRIES = 64
+
+_lock = threading.Lock()
+_entries = {}  # (year, start_date, end_date) -> (version, created_at, stats)
+_counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+def get_cached_stats(year=None, start_date=None, end_date=None):
+    """
+    Retourne les statistiques du dashboard depuis le cache si elles sont
+    toujours valides (même version des données et TTL non expiré),
+    sinon les recalcule.
+    """
+    from services.stats_service import compute_dashboard_stats
+
+    key = (year, start_date, end_date)
+    ttl = current_app.config.get('STATS_CACHE_TTL', 300)
+    version = get_version(STATS_VERSION)
+    now = time.monotonic()
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry and entry[0] == version and now - entry[1] < ttl:
+            _counters['hits'] += 1
+            return entry[2]
+        _counters['misses'] += 1
+
+    stats = compute_dashboard_stats(year, start_date, end_date)
+
+    with _lock:
+        if len(_entries) >= _MAX_ENTRIES and key not in _entries:
+            oldest = min(_entries, key=lambda k: _entries[k][1])
+            del _entries[oldest]
+        _entries[key] = (version, now, stats)
+    return stats
+
+def clear_stats_cache():
+    with _lock:
+        _entries.clear()
+        _counters['invalidations'] += 1
+
+def cache_info():
+    """Compteurs hits/misses/invalidations et taille du cache (pour ce worker)."""
+    with _lock:
+        return dict(_counters, size=len(_entries))
+
+def _mark_changes(session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, (Document, LigneDocument, Expense)):
+            continue
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        # Incrément dans la même transaction : visible par tous les workers au commit
+        bump_version(STATS_VERSION, session.connection())
+        session.info['stats_changed'] = True
+        return
+
+def _after_commit(session):
+    if session.info.pop('stats_changed', False):
+        clear_stats_cache()
+
+def _after_rollback(session):
+    session.info.pop('stats_changed', None)
+
+def register_stats_cache_listeners():
+    """Invalide le cache des statistiques à chaque modification réelle d'un Document ou d'une Expense."""
+    if not event.contains(Session, 'after_flush', _mark_changes):
+        event.listen(Session, 'after_flush', _mark_changes)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
@@ -0,0 +1,228 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, extract, case, or_
+from extensions import db
+from models import Document, Expense, Client
+
+def resolve_period(year_filter=None, date_start_str=None, date_end_str=None):
+    """
+    Détermine la période de filtrage du dashboard.
+    Retourne (start_date, end_date, filter_label, chart_mode, year_filter).
+    """
+    if date_start_str and date_end_str:
+        start_date = datetime.strptime(date_start_str, '%Y-%m-%d')
+        end_date = datetime.strptime(date_end_str, '%Y-%m-%d') + timedelta(days=1)
+        filter_label = f"du {date_start_str} au {date_end_str}"
+        chart_mode = 'daily'
+    elif year_filter:
+        start_date = datetime(year_filter, 1, 1)
+        end_date = datetime(year_filter + 1, 1, 1)
+        filter_label = f"Année {year_filter}"
+        chart_mode = 'monthly'
+    else:
+        # Par défaut : Année en cours
+        year_filter = datetime.now().year
+        start_date = datetime(year_filter, 1, 1)
+        end_date = datetime(year_filter + 1, 1, 1)
+        filter_label = f"Année {year_filter} (en cours)"
+        chart_mode = 'monthly'
+    return start_date, end_date, filter_label, chart_mode, year_filter
+
+def _build_buckets(start_date, end_date, chart_mode):
+    """
+    Retourne (labels, step) pour le graphique.
+    En mode mensuel, step vaut None et les buckets sont les mois 1..12.
+    """
+    if chart_mode == 'monthly':
+        labels = [datetime(start_date.year, month, 1).strftime('%b') for month in range(1, 13)]
+        return labels, None
+
+    delta = end_date - start_date
+    step = 1 if delta.days <= 60 else max(1, delta.days // 20)
+    labels = []
+    curr = start_date
+    while curr < end_date:
+        labels.append(curr.strftime('%d/%m'))
+        curr = curr + timedelta(days=step)
+    return labels, step
+
+def _bucket_index(key, start_date, step):
+    """Convertit la clé de regroupement SQL (mois ou jour) en index de bucket."""
+    if key is None:
+        return None
+    if step is None:
+        return int(key) - 1
+    # func.date() renvoie une chaîne 'YYYY-MM-DD' sous SQLite, un objet date ailleurs
+    day = datetime.strptime(str(key)[:10], '%Y-%m-%d').date()
+    return (day - start_date.date()).days // step
+
+def compute_dashboard_stats(year_filter=None, date_start_str=None, date_end_str=None):
+    """
+    Calcule toutes les statistiques du dashboard en quelques requêtes groupées.
+
+    En mode mensuel, les totaux et les séries sont lus depuis le rollup mensuel
+    (services/rollup_service). En mode journalier, ils sortent d'une seule
+    agrégation conditionnelle sur Document, regroupée par type et par jour ;
+    les notes de frais ont leur propre requête.
+    Retourne le dict consommé par index.html et stats_pdf.html.
+    """
+    start_date, end_date, filter_label, chart_mode, year_filter = resolve_period(
+        year_filter, date_start_str, date_end_str)
+    labels, step = _build_buckets(start_date, end_date, chart_mode)
+
+    # Factures ayant un avoir associé (exclues du CA)
+    avoir_sources = db.session.query(Document.source_document_id).filter(
+        Document.type == 'avoir',
+        Document.source_document_id.isnot(None)
+    )
+    # Devis source d'une facture (conversion)
+    converted_ids = db.session.query(Document.source_document_id).filter(
+        Document.type == 'facture',
+        Document.source_document_id.isnot(None)
+    )
+
+    if step is None:
+        # Mode mensuel : lecture directe du rollup (O(mois) au lieu de O(documents))
+        from services.rollup_service import read_rollup
+        converted_devis_count = db.session.query(func.count(Document.id)).filter(
+            Document.type == 'devis',
+            Document.date >= start_date,
+            Document.date < end_date,
+            Document.id.in_(converted_ids)
+        ).scalar() or 0
+
+        doc_rows = []
+        expense_rows = []
+        for doc_type, month, ht, tva, ttc, regle, autoliq, count in read_rollup(year=start_date.year, by_month=True):
+            if doc_type == 'expense':
+                expense_rows.append((month, ht, tva))
+            else:
+                doc_rows.append((doc_type, month, ht, tva, ttc, regle, autoliq, count, 0))
+    else:
+        doc_bucket = func.date(Document.date)
+        exp_bucket = func.date(Expense.date)
+
+        # 1. Agrégation unique sur les documents (factures, commandes, devis)
+        doc_rows = db.session.query(
+            Document.type,
+            doc_bucket.label('bucket'),
+            func.sum(Document.montant_ht),
+            func.sum(Document.tva),
+            func.sum(Document.montant_ttc),
+            func.sum(case((Document.paid == True, Document.montant_ttc), else_=0.0)),
+            func.sum(case((Document.autoliquidation == True, Document.montant_ht), else_=0.0)),
+            func.count(Document.id),
+            func.sum(case((Document.id.in_(converted_ids), 1), else_=0))
+        ).filter(
+            Document.type.in_(['facture', 'bon_de_commande', 'devis']),
+            Document.date >= start_date,
+            Document.date < end_date,
+            or_(Document.type != 'facture', ~Document.id.in_(avoir_sources))
+        ).group_by(Document.type, 'bucket').all()
+
+        # 2. Agrégation des notes de frais
+        expense_rows = db.session.query(
+            exp_bucket.label('bucket'),
+            func.sum(Expense.amount_ht),
+            func.sum(Expense.tva)
+        ).filter(
+            Expense.date >= start_date,
+            Expense.date < end_date
+        ).group_by('bucket').all()
+
+    total_ht = total_ttc = total_tva = total_autoliq = total_regle = 0.0
+    total_depenses_commandes = tva_commandes = 0.0
+    total_depenses_expenses = tva_expenses = 0.0
+    total_devis = converted_devis = 0
+
+    monthly_data = [0.0] * len(labels)
+    commande_series = [0.0] * len(labels)
+    expense_series = [0.0] * len(labels)
+
+    for doc_type, bucket, ht, tva, ttc, regle, autoliq, count, converted in doc_rows:
+        ht = ht or 0.0
+        idx = _bucket_index(bucket, start_date, step)
+        in_chart = idx is not None and 0 <= idx < len(labels)
+        if doc_type == 'facture':
+            total_ht += ht
+            total_tva += tva or 0.0
+            total_ttc += ttc or 0.0
+            total_regle += regle or 0.0
+            total_autoliq += autoliq or 0.0
+            if in_chart:
+                monthly_data[idx] += ht
+        elif doc_type == 'bon_de_commande':
+            total_depenses_commandes += ht
+            tva_commandes += tva or 0.0
+            if in_chart:
+                commande_series[idx] += ht
+        elif doc_type == 'devis':
+            total_devis += count or 0
+            converted_devis += converted or 0
+
+    for bucket, amount_ht, tva in expense_rows:
+        total_depenses_expenses += amount_ht or 0.0
+        tva_expenses += tva or 0.0
+        idx = _bucket_index(bucket, start_date, step)
+        if idx is not None and 0 <= idx < len(labels):
+            expense_series[idx] += amount_ht or 0.0
+
+    # Le graphique journalier ne reprend que les commandes fournisseurs
+    if step is None:
+        converted_devis = converted_devis_count
+        monthly_expense_data = [c + e for c, e in zip(commande_series, expense_series)]
+    else:
+        monthly_expense_data = commande_series
+
+    total_impaye = total_ttc - total_regle
+    total_depenses = total_depenses_commandes + total_depenses_expenses
+    total_tva_deductible = tva_commandes + tva_expenses
+    benefice_net = total_ht - total_depenses
+    tva_nette = total_tva - total_tva_deductible
+
+    # 3. Statistiques par Client
+    client_stats_query = db.session.query(
+        Client.raison_sociale,
+        func.sum(Document.montant_ht).label('total_ht')
+    ).join(Document, Document.client_id == Client.id).filter(
+        Document.type == 'facture',
+        Document.date >= start_date,
+        Document.date < end_date,
+        ~Document.id.in_(avoir_sources)
+    ).group_by(Client.raison_sociale).order_by(func.sum(Document.montant_ht).desc()).limit(10).all()
+
+    client_labels = [row[0] for row in client_stats_query]
+    client_data = [float(row[1]) for row in client_stats_query]
+
+    # 4. Années disponibles
+    years = db.session.query(extract('year', Document.date)).filter(Document.type == 'facture').distinct().all()
+    available_years = sorted([int(y[0]) for y in years if y[0]], reverse=True)
+    if datetime.now().year not in available_years:
+        available_years.insert(0, datetime.now().year)
+
+    conversion_rate = (converted_devis / total_devis * 100) if total_devis > 0 else 0.0
+
+    return {
+        'total_ht': total_ht,
+        'total_ttc': total_ttc,
+        'total_tva': total_tva,
+        'total_autoliq': total_autoliq,
+        'total_regle': total_regle,
+        'total_impaye': total_impaye,
+        'total_depenses': total_depenses,
+        'total_tva_deductible': total_tva_deductible,
+        'tva_nette': tva_nette,
+        'benefice_net': benefice_net,
+        'monthly_labels': labels,
+        'monthly_data': monthly_data,
+        'monthly_expense_data': monthly_expense_data,
+        'client_labels': client_labels,
+        'client_data': client_data,
+        'filter_label': filter_label,
+        'available_years': available_years,
+        'current_year': year_filter,
+        'start_date': date_start_str,
+        'end_date': date_end_str,
+        'total_devis': total_devis,
+        'converted_devis': converted_devis,
+        'conversion_rate': conversion_rate
+    }
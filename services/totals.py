@@ -0,0 +1,118 @@
+from sqlalchemy import select, update, func, case
+from extensions import db
+from models import Document, LigneDocument
+
+# Écart toléré entre montant stocké et montant recalculé (demi-centime)
+TOLERANCE = 0.005
+
+# Calcul des montants d'un document : une seule formule pour les routes,
+# l'assistant et l'audit. Quantité ou prix absents valent 0.
+
+def line_total(quantite, prix_unitaire):
+    """Total d'une ligne."""
+    return (quantite or 0.0) * (prix_unitaire or 0.0)
+
+def line_totals(quantities, prices):
+    """Totaux de ligne de deux séquences parallèles (quantités, prix)."""
+    return [line_total(q, p) for q, p in zip(quantities, prices)]
+
+def compute_totals(total_ht, tva_rate, autoliquidation):
+    """(montant_ht, tva, montant_ttc) à partir du total HT des lignes."""
+    total_ht = total_ht or 0.0
+    tva = 0.0 if autoliquidation else total_ht * ((tva_rate or 0.0) / 100)
+    return total_ht, tva, total_ht + tva
+
+def document_totals(quantities, prices, tva_rate, autoliquidation):
+    """Totaux d'un document à partir des quantités et prix de ses lignes."""
+    return compute_totals(sum(line_totals(quantities, prices)), tva_rate, autoliquidation)
+
+def apply_totals(document, total_ht=None):
+    """
+    Écrit montant_ht, tva et montant_ttc sur `document`. Sans `total_ht`,
+    le total est la somme des total_ligne de ses lignes.
+    """
+    if total_ht is None:
+        total_ht = sum(ligne.total_ligne or 0.0 for ligne in document.lignes)
+    document.montant_ht, document.tva, document.montant_ttc = compute_totals(
+        total_ht, document.tva_rate, document.autoliquidation)
+    return document
+
+# Même formule en SQL, pour recalculer toute la table en une requête
+
+def _line_expr():
+    return func.coalesce(LigneDocument.quantite, 0.0) * func.coalesce(LigneDocument.prix_unitaire, 0.0)
+
+def expected_totals_query(doc_type=None):
+    """
+    SELECT (id, numero, type, montants stockés, montants attendus)
+    de chaque document : les lignes sont agrégées en un seul GROUP BY puis
+    jointes aux documents (les documents sans ligne valent 0).
+    """
+    lines = select(
+        LigneDocument.document_id.label('document_id'),
+        func.sum(_line_expr()).label('total_ht')
+    ).group_by(LigneDocument.document_id).subquery()
+
+    ht = func.coalesce(lines.c.total_ht, 0.0)
+    tva = case(
+        (Document.autoliquidation == True, 0.0),
+        else_=ht * func.coalesce(Document.tva_rate, 0.0) / 100
+    )
+    stmt = select(
+        Document.id, Document.numero, Document.type,
+        Document.montant_ht, Document.tva, Document.montant_ttc,
+        ht.label('expected_ht'), tva.label('expected_tva'), (ht + tva).label('expected_ttc')
+    ).outerjoin(lines, lines.c.document_id == Document.id)
+    if doc_type:
+        stmt = stmt.where(Document.type == doc_type)
+    return stmt
+
+def _drifts(stored, expected, tolerance):
+    return func.abs(func.coalesce(stored, 0.0) - expected) > tolerance
+
+def audit_totals(fix=False, doc_type=None, tolerance=TOLERANCE):
+    """
+    Compare les montants stockés aux montants recalculés depuis les lignes.
+    Retourne {'lines': nb de total_ligne faux, 'documents': [lignes en écart]}.
+    Avec fix=True, corrige en masse (un UPDATE pour les lignes, un UPDATE
+    groupé par clé primaire pour les documents) puis reconstruit le rollup
+    (ce qui commite). Les PDF en cache sont régénérés au prochain accès.
+    """
+    line_drift = _drifts(LigneDocument.total_ligne, _line_expr(), tolerance)
+    lines_stmt = select(func.count(LigneDocument.id)).where(line_drift)
+    if doc_type:
+        lines_stmt = lines_stmt.join(Document, Document.id == LigneDocument.document_id).where(Document.type == doc_type)
+    bad_lines = db.session.execute(lines_stmt).scalar() or 0
+
+    expected = expected_totals_query(doc_type).subquery()
+    documents = db.session.execute(
+        select(expected).where(
+            _drifts(expected.c.montant_ht, expected.c.expected_ht, tolerance) |
+            _drifts(expected.c.tva, expected.c.expected_tva, tolerance) |
+            _drifts(expected.c.montant_ttc, expected.c.expected_ttc, tolerance)
+        ).order_by(expected.c.id)
+    ).all()
+
+    if fix and (bad_lines or documents):
+        if bad_lines:
+            stmt = update(LigneDocument).where(line_drift).values(total_ligne=_line_expr())
+            if doc_type:
+                stmt = stmt.where(LigneDocument.document_id.in_(
+                    select(Document.id).where(Document.type == doc_type)))
+            db.session.execute(stmt, execution_options={'synchronize_session': False})
+        if documents:
+            db.session.execute(update(Document), [
+                {'id': row.id, 'montant_ht': row.expected_ht, 'tva': row.expected_tva,
+                 'montant_ttc': row.expected_ttc}
+                for row in documents
+            ])
+
+        # Les UPDATE en masse ne déclenchent pas les listeners : invalidation explicite
+        from services.versioning import bump_version
+        from services.stats_cache import STATS_VERSION
+        from services.rollup_service import rebuild_rollup
+        bump_version(STATS_VERSION)
+        db.session.info['stats_changed'] = True
+        rebuild_rollup()
+
+    return {'lines': bad_lines, 'documents': documents}
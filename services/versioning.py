@@ -0,0 +1,22 @@
+from sqlalchemy import select, update, insert
+from extensions import db
+from models import DataVersion
+
+def get_version(name, connection=None):
+    """Retourne la version courante du compteur `name` (0 s'il n'existe pas encore)."""
+    conn = connection if connection is not None else db.session
+    value = conn.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar()
+    return value or 0
+
+def bump_version(name, connection=None):
+    """
+    Incrémente le compteur `name` dans la transaction en cours.
+    Le commit reste à la charge de l'appelant.
+    """
+    conn = connection if connection is not None else db.session
+    table = DataVersion.__table__
+    result = conn.execute(
+        update(table).where(table.c.name == name).values(version=table.c.version + 1)
+    )
+    if result.rowcount == 0:
+        conn.execute(insert(table).values(name=name, version=1))
@@ -76,3 +76,80 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 });
+
+// "Charger plus" des listes paginées : ajoute les lignes de la page suivante
+// au tableau courant au lieu de recharger la page.
+document.addEventListener('click', function (e) {
+    const link = e.target.closest('a.load-more');
+    if (!link) return;
+    e.preventDefault();
+    link.classList.add('disabled');
+
+    fetch(link.href, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+        .then(response => response.text())
+        .then(html => {
+            const page = new DOMParser().parseFromString(html, 'text/html');
+            const tbody = document.getElementById(link.dataset.target);
+            const rows = page.getElementById(link.dataset.target);
+            if (tbody && rows) {
+                tbody.append(...rows.children);
+            }
+            const container = link.closest('.load-more-container');
+            const next = page.querySelector('.load-more-container');
+            if (next) {
+                container.replaceWith(document.adoptNode(next));
+            } else {
+                container.remove();
+            }
+        })
+        .catch(() => { window.location.href = link.href; });
+});
+
+// Sélecteur client / fournisseur : recherche par préfixe via l'API JSON
+// (data-url) ; le choix remplace l'unique option du <select> ciblé (data-target).
+document.querySelectorAll('.entity-picker').forEach(function (input) {
+    const select = document.getElementById(input.dataset.target);
+    const results = document.createElement('div');
+    results.className = 'list-group position-absolute shadow-sm d-none';
+    results.style.zIndex = 1050;
+    input.parentNode.classList.add('position-relative');
+    input.after(results);
+    let timer = null;
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        const q = input.value.trim();
+        if (!q) {
+            results.classList.add('d-none');
+            return;
+        }
+        timer = setTimeout(() => {
+            fetch(`${input.dataset.url}?q=${encodeURIComponent(q)}`)
+                .then(response => response.json())
+                .then(data => {
+                    results.innerHTML = '';
+                    data.results.forEach(item => {
+                        const option = document.createElement('button');
+                        option.type = 'button';
+                        option.className = 'list-group-item list-group-item-action';
+                        option.textContent = item.ville ? `${item.label} (${item.ville})` : item.label;
+                        option.addEventListener('click', function () {
+                            select.innerHTML = '';
+                            select.add(new Option(item.label, item.id, true, true));
+                            select.dispatchEvent(new Event('change'));
+                            input.value = '';
+                            results.classList.add('d-none');
+                        });
+                        results.appendChild(option);
+                    });
+                    results.classList.toggle('d-none', data.results.length === 0);
+                });
+        }, 200);
+    });
+
+    document.addEventListener('click', function (e) {
+        if (e.target !== input && !results.contains(e.target)) {
+            results.classList.add('d-none');
+        }
+    });
+});
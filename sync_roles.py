@@ -1,6 +1,6 @@
 from app import create_app
 from extensions import db
-from models import Role
+from models import Role, User
 
 app = create_app()
 
@@ -61,6 +61,10 @@ def sync_roles():
         if roles_added or roles_updated or roles_deleted:
             try:
                 db.session.commit()
+                # Role set changed: recompute every user's permission mask
+                for user in User.query.all():
+                    user.refresh_permissions()
+                db.session.commit()
                 print(f"✅ Sync Complete: +{roles_added} Added, ~{roles_updated} Updated, -{roles_deleted} Deleted.")
             except Exception as e:
                 db.session.rollback()
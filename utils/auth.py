@@ -1,16 +1,20 @@
 from functools import wraps
 from flask import abort
 from flask_login import current_user
+from models import role_mask
 
 def role_required(roles):
+    # Masque calculé une fois à la décoration : le contrôle est un ET binaire
+    required = role_mask(roles)
+
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             if not current_user.is_authenticated:
                 return abort(401)
             
-            # Use the new helper method which also handles 'admin' as superuser
-            if not current_user.has_any_role(roles):
+            # Bitmask check, 'admin' is handled as superuser
+            if not current_user.has_permission(required):
                 return abort(403)
             
             return f(*args, **kwargs)
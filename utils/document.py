@@ -1,35 +1,229 @@
-from models import Document
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import extract, update, insert, select, delete, or_, and_
+from sqlalchemy.exc import IntegrityError
+from models import Document, DocumentSequence, LigneDocument
 from extensions import db
+from services.totals import line_total
 
-def generate_document_number(prefix, year):
+def filter_by_period(query, month, year, column=Document.date):
+    """
+    Applies the month/year filters of the list pages as date bounds
+    (usable by the (type, date) index) instead of extract() comparisons.
+    'all', '' and None mean "no filter".
+    """
+    month = int(month) if month and month != 'all' else None
+    year = int(year) if year and year != 'all' else None
+
+    if year:
+        if month:
+            start = datetime(year, month, 1)
+            end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+        else:
+            start = datetime(year, 1, 1)
+            end = datetime(year + 1, 1, 1)
+        return query.filter(column >= start, column < end)
+
+    if month:
+        # Month across every year: no usable range
+        return query.filter(extract('month', column) == month)
+    return query
+
+# Cursor value of a row whose sort key is NULL (e.g. legacy rows without updated_at)
+NULL_CURSOR = 'null'
+
+def encode_cursor(value, doc_id):
+    """Cursor pointing after the row (value, doc_id) of a keyset-paginated list."""
+    if value is None:
+        value = NULL_CURSOR
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    else:
+        value = repr(float(value))
+    return f'{value}_{doc_id}'
+
+def decode_cursor(cursor):
+    """Returns (value, id) from a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        value, doc_id = cursor.rsplit('_', 1)
+        if value == NULL_CURSOR:
+            return None, int(doc_id)
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            value = float(value)
+        return value, int(doc_id)
+    except ValueError:
+        return None
+
+def _after(sort, value, doc_id, ascending):
+    # SQLite sorts NULLs first in ascending order and last in descending order
+    if value is None:
+        null_tail = and_(sort.is_(None), Document.id < doc_id)
+        return or_(null_tail, sort.isnot(None)) if ascending else null_tail
+    after = or_(
+        sort > value if ascending else sort < value,
+        and_(sort == value, Document.id < doc_id)
+    )
+    return after if ascending else or_(after, sort.is_(None))
+
+def paginate_keyset(query, cursor=None, per_page=None, sort=None, ascending=False):
+    """
+    Keyset pagination of a Document query on (sort, id desc), sort being
+    updated_at desc by default (or a search score, see services.search_index).
+    Only the requested page is loaded, whatever the size of the table:
+    the cursor becomes a WHERE clause served by the (type, updated_at) index
+    instead of an OFFSET. Rows with a NULL sort key come last (first when
+    ascending) and stay reachable. Returns (documents, next_cursor);
+    next_cursor is None on the last page.
+    """
+    max_size = current_app.config.get('LIST_PAGE_SIZE_MAX', 200)
+    per_page = min(max(per_page or current_app.config.get('LIST_PAGE_SIZE', 50), 1), max_size)
+    sort = Document.updated_at if sort is None else sort
+
+    position = decode_cursor(cursor)
+    if position:
+        query = query.filter(_after(sort, *position, ascending))
+
+    # One extra row tells whether a next page exists
+    rows = query.add_columns(sort).order_by(
+        sort.asc() if ascending else sort.desc(), Document.id.desc()
+    ).limit(per_page + 1).all()
+    documents = [doc for doc, _ in rows[:per_page]]
+    if len(rows) > per_page:
+        last, value = rows[per_page - 1]
+        return documents, encode_cursor(value, last.id)
+    return documents, None
+
+def max_existing_suffix(prefix, year):
     """
-    Generates a robust document number in the format PREFIX-YEAR-XXXX.
-    Increments based on the highest existing suffix and verifies availability.
+    Returns the highest numeric suffix already used for PREFIX-YEAR-XXXX,
+    computed in SQL (used to seed the sequence).
     """
     pattern = f'{prefix}-{year}-%'
-    
-    # Get all matching numbers to find the true maximum suffix
-    documents = Document.query.filter(Document.numero.like(pattern)).all()
-    
-    max_num = 0
-    for doc in documents:
+    offset = len(prefix) + len(str(year)) + 3  # 'F-2025-0001' -> substr from '0001'
+    suffix = db.cast(db.func.substr(Document.numero, offset), db.Integer)
+    return db.session.query(db.func.max(suffix)).filter(Document.numero.like(pattern)).scalar() or 0
+
+def next_sequence_value(prefix, year):
+    """
+    Atomically increments the (prefix, year) sequence in the current transaction
+    and returns the new value. The row is seeded from the existing numbers the
+    first time it is needed. The UPDATE takes the write lock, so concurrent
+    creations are serialised until the caller commits (or rolls back).
+    If the number is already taken (document numbered manually or imported
+    after seeding), the sequence jumps past the highest existing number.
+    """
+    table = DocumentSequence.__table__
+    key = (table.c.prefix == prefix) & (table.c.year == year)
+
+    result = db.session.execute(update(table).where(key).values(last_value=table.c.last_value + 1))
+    if result.rowcount == 0:
+        first_value = max_existing_suffix(prefix, year) + 1
         try:
-            # Suffix is the last part: F-2025-0001 -> 0001
-            parts = doc.numero.split('-')
-            if len(parts) >= 3:
-                num = int(parts[-1]) # Use parts[-1] to be safer if number format varies
-                if num > max_num:
-                    max_num = num
-        except (ValueError, IndexError):
+            with db.session.begin_nested():
+                db.session.execute(insert(table).values(prefix=prefix, year=year, last_value=first_value))
+            return first_value
+        except IntegrityError:
+            # Seeded concurrently by another transaction: increment it instead
+            db.session.execute(update(table).where(key).values(last_value=table.c.last_value + 1))
+
+    value = db.session.execute(select(table.c.last_value).where(key)).scalar()
+    # Lookup on the unique numero index
+    taken = db.session.execute(
+        select(Document.id).where(Document.numero == format_document_number(prefix, year, value))
+    ).first()
+    if taken:
+        value = max(value, max_existing_suffix(prefix, year)) + 1
+        db.session.execute(update(table).where(key).values(last_value=value))
+    return value
+
+def format_document_number(prefix, year, value):
+    return f'{prefix}-{year}-{value:04d}'
+
+def generate_document_number(prefix, year):
+    """
+    Generates a document number in the format PREFIX-YEAR-XXXX from the
+    document_sequence table. The increment is part of the caller's
+    transaction: commit the new document to consume the number.
+    """
+    return format_document_number(prefix, year, next_sequence_value(prefix, year))
+
+LINE_FIELDS = ('designation', 'quantite', 'prix_unitaire', 'total_ligne', 'category')
+
+def fill_line_ids(form, document):
+    """Carries the id of each existing line into the form (GET of an edit page)."""
+    for ligne_form, ligne in zip(form.lignes, document.lignes):
+        ligne_form.line_id.data = ligne.id
+
+def _line_values(ligne_form):
+    # Handle None values
+    qte = ligne_form.quantite.data if ligne_form.quantite.data is not None else 0.0
+    prix = ligne_form.prix_unitaire.data if ligne_form.prix_unitaire.data is not None else 0.0
+    return {
+        'designation': ligne_form.designation.data,
+        'quantite': qte,
+        'prix_unitaire': prix,
+        'total_ligne': line_total(qte, prix),
+        'category': ligne_form.category.data,
+    }
+
+def lines_from_forms(line_forms):
+    """New LigneDocument objects for the submitted lines (creation pages)."""
+    return [LigneDocument(**_line_values(ligne_form)) for ligne_form in line_forms]
+
+def sync_lines(document, line_forms):
+    """
+    Applies the submitted lines to `document` as a diff against the stored
+    ones, matched by their line id: one bulk DELETE for the removed lines,
+    one bulk UPDATE for the modified ones and one bulk INSERT for the new
+    ones. Unchanged lines are not written and keep their ids.
+    The new montant_ht is derived from the previous one and the changed
+    rows only; it is returned and the caller recomputes TVA/TTC.
+    """
+    existing = {ligne.id: ligne for ligne in document.lignes}
+    inserts, updates, kept = [], [], set()
+    delta = 0.0
+
+    for ligne_form in line_forms:
+        values = _line_values(ligne_form)
+        try:
+            line_id = int(ligne_form.line_id.data)
+        except (TypeError, ValueError):
+            line_id = None
+        current = existing.get(line_id) if line_id not in kept else None
+
+        if current is None:
+            inserts.append(dict(values, document_id=document.id))
+            delta += values['total_ligne']
             continue
-            
-    next_num = max_num + 1
-    
-    # FINAL SAFETY: Check if the candidate number already exists (collision protection)
-    while True:
-        candidate = f'{prefix}-{year}-{next_num:04d}'
-        # We check across ALL documents, not just matching the prefix, to be 100% sure
-        existing = Document.query.filter_by(numero=candidate).first()
-        if not existing:
-            return candidate
-        next_num += 1
+        kept.add(line_id)
+        if any(getattr(current, field) != values[field] for field in LINE_FIELDS):
+            updates.append(dict(values, id=line_id))
+            delta += values['total_ligne'] - (current.total_ligne or 0.0)
+
+    deleted = [line_id for line_id in existing if line_id not in kept]
+    delta -= sum(existing[line_id].total_ligne or 0.0 for line_id in deleted)
+
+    if deleted:
+        db.session.execute(
+            delete(LigneDocument).where(LigneDocument.id.in_(deleted)),
+            execution_options={'synchronize_session': False}
+        )
+    if updates:
+        db.session.execute(update(LigneDocument), updates)
+        # The bulk UPDATE by primary key does not refresh the loaded objects
+        for values in updates:
+            db.session.expire(existing[values['id']])
+    if inserts:
+        db.session.execute(insert(LigneDocument), inserts)
+
+    if deleted or updates or inserts:
+        # The collection no longer matches the table; the document is marked
+        # as modified so the flush listeners (rollup, stats, search) see it
+        db.session.expire(document, ['lignes'])
+        document.updated_at = datetime.utcnow()
+
+    return (document.montant_ht or 0.0) + delta
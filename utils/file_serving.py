@@ -0,0 +1,51 @@
+import mimetypes
+import os
+from urllib.parse import quote
+from flask import current_app, request, send_from_directory, abort, Response
+from werkzeug.security import safe_join
+
+# Envoi des fichiers d'UPLOAD_FOLDER (PDF archivés, justificatifs).
+# Sans configuration, Flask sert le fichier avec requêtes conditionnelles
+# (ETag, 304) et plages d'octets (Range, 206). Avec FILE_OFFLOAD, la route
+# ne fait que le contrôle d'accès et le 304 : le proxy frontal lit et envoie
+# le fichier (X-Accel-Redirect pour nginx, X-Sendfile pour Apache / lighttpd),
+# le worker Python est libéré immédiatement.
+OFFLOAD_MODES = ('x-accel-redirect', 'x-sendfile')
+
+def _offload(path, relative_path, etag, mimetype, download_name):
+    mode = current_app.config['FILE_OFFLOAD']
+    response = Response(mimetype=mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    if mode == 'x-accel-redirect':
+        prefix = current_app.config['FILE_OFFLOAD_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = f"{prefix}/{quote(relative_path.replace(os.sep, '/'))}"
+    else:
+        response.headers['X-Sendfile'] = path
+    if download_name:
+        response.headers.set('Content-Disposition', 'inline', filename=download_name)
+    if etag:
+        response.set_etag(etag)
+    return response
+
+def send_upload(relative_path, etag=None, mimetype=None, download_name=None):
+    """
+    Réponse envoyant le fichier `relative_path` d'UPLOAD_FOLDER.
+    `etag` : ETag fort (empreinte du contenu) ; par défaut celui de Flask
+    (date, taille et nom du fichier). Le navigateur revalide à chaque
+    affichage (Cache-Control: private, no-cache) et reçoit un 304 sans
+    corps tant que le fichier n'a pas changé.
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    path = safe_join(folder, relative_path)
+    if path is None:
+        abort(404)
+
+    if current_app.config.get('FILE_OFFLOAD') in OFFLOAD_MODES:
+        # Le proxy gère Range ; le 304 est décidé ici, sans transfert
+        response = _offload(path, relative_path, etag, mimetype, download_name)
+        response = response.make_conditional(request)
+    else:
+        response = send_from_directory(folder, relative_path, etag=etag or True,
+                                       mimetype=mimetype, download_name=download_name)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
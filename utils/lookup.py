@@ -0,0 +1,25 @@
+from flask import current_app
+from extensions import db
+
+def search_by_name(model, q, limit=None):
+    """
+    Premières entités (Client, Supplier) dont la raison sociale commence par `q`,
+    sans tenir compte de la casse. Le préfixe est cherché par intervalle
+    [q, q + U+10FFFF[ : le filtre et le tri utilisent l'index raison_sociale
+    COLLATE NOCASE, le coût ne dépend pas de la taille de la table, et '%'
+    ou '_' saisis sont cherchés tels quels.
+    """
+    max_limit = current_app.config.get('PICKER_LIMIT', 20)
+    limit = min(limit, max_limit) if limit else max_limit
+    q = (q or '').strip()
+    if not q:
+        return []
+    name = model.raison_sociale.collate('NOCASE')
+    return model.query.filter(name >= q, name < q + '\U0010ffff').order_by(name).limit(limit).all()
+
+def selected_choice(model, entity_id):
+    """Choix d'un SelectField réduit à l'entité sélectionnée (affichage du sélecteur)."""
+    entity = db.session.get(model, entity_id) if entity_id else None
+    if entity is None:
+        return []
+    return [(entity.id, entity.raison_sociale)]
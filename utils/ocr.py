@@ -1,5 +1,5 @@
 from services.ai_agent import GoogleProvider
-from models import AISettings
+from services.settings_registry import get_ai_settings
 import json
 import re
 
@@ -10,7 +10,7 @@ def extract_expense_data(image_path):
     """
     print(f"AI OCR: Processing {image_path}...")
     
-    settings = AISettings.get_settings()
+    settings = get_ai_settings()
     if not settings.enabled:
         return {"error": "AI is disabled in settings"}
         
@@ -0,0 +1,29 @@
+import sys
+from app import create_app
+
+app = create_app()
+
+def verify(deep=False, fix=False):
+    """
+    Contrôle le magasin d'archives : chaque fichier enregistré doit exister
+    avec la taille attendue (et, avec --deep, le même sha256). Avec --fix,
+    les entrées en défaut sont retirées : les PDF concernés seront rendus
+    de nouveau au prochain accès.
+    """
+    from services.archive_store import verify_store
+    from services.pdf_cache import forget_pdfs
+
+    with app.app_context():
+        bad = verify_store(deep=deep)
+        if not bad:
+            print("✅ Archive store OK.")
+            return
+        print(f"❌ {len(bad)} file(s) missing or corrupted:")
+        for sha256 in bad:
+            print(f"   {sha256}")
+        if fix:
+            forget_pdfs(bad)
+            print("✅ Entries removed, PDFs will be re-rendered on demand.")
+
+if __name__ == "__main__":
+    verify(deep='--deep' in sys.argv, fix='--fix' in sys.argv)